@@ -1,6 +1,6 @@
 /* eslint-disable jsx-a11y/label-has-associated-control */
 /* eslint-disable react/jsx-props-no-spreading */
-import React from 'react'
+import React, { useState } from 'react'
 import {
   BrowserRouter,
   Link,
@@ -16,21 +16,27 @@ import { toast, ToastContainer } from 'react-toastify'
 import 'react-toastify/dist/ReactToastify.css'
 import styled, { css } from 'styled-components'
 import Modal from 'react-modal'
+import { Election as ElectionDefinition } from '@votingworks/ballot-encoder'
 import {
   ApiProvider,
   AdminUser,
   useCreateElection,
   useElections,
   useElection,
+  useElectionDefinition,
+  useVoters,
+  useVoter,
   Election,
   useUploadVoterFile,
   useSendBallotEmails,
+  useBallotEmailCounts,
   useAuth,
   useDeleteElection,
   VoterUser,
   useAddVoter,
   NewVoter,
   useDeleteVoter,
+  VoterFilters,
 } from './api'
 import FlexTable from './FlexTable'
 import VoterBallot from './VoterBallot'
@@ -204,11 +210,10 @@ const AdminHome = () => {
         <Section>
           <h2>Elections</h2>
           <ul style={{ padding: 0, listStyle: 'none' }}>
-            {elections.data.map(({ definition, id }) => (
+            {elections.data.map(({ title, county, id }) => (
               <li key={id} style={{ marginBottom: '10px' }}>
                 <LinkButton large to={`/elections/${id}`}>
-                  {definition.title} - {definition.county.name} -{' '}
-                  {definition.county.id}
+                  {title} - {county.name} - {county.id}
                 </LinkButton>
                 <button
                   type="button"
@@ -236,6 +241,7 @@ const AdminHome = () => {
 
 const SendBallots = ({ election }: { election: Election }) => {
   const sendBallotEmails = useSendBallotEmails(election.id)
+  const ballotEmailCounts = useBallotEmailCounts(election.id)
   const { register, handleSubmit, watch } = useForm<{ template: string }>({
     defaultValues: {
       template: 'Click the link below to fill out and print your ballot:',
@@ -248,11 +254,8 @@ const SendBallots = ({ election }: { election: Election }) => {
     template: string
   }) => {
     try {
-      await sendBallotEmails.mutateAsync({
-        voterIds: election.voters.map(voter => voter.id),
-        template,
-      })
-      toast.success('Ballots sent!')
+      await sendBallotEmails.mutateAsync({ template })
+      toast.success('Ballots queued to send!')
     } catch (error) {
       toast.error(error.message)
     }
@@ -316,6 +319,13 @@ const SendBallots = ({ election }: { election: Election }) => {
           Send ballots to all voters
         </Button>
       </form>
+      {ballotEmailCounts.isSuccess && (
+        <p>
+          Ballot emails: {ballotEmailCounts.data.queued} queued,{' '}
+          {ballotEmailCounts.data.sent} sent, {ballotEmailCounts.data.failed}{' '}
+          failed
+        </p>
+      )}
     </Section>
   )
 }
@@ -347,7 +357,13 @@ const Form = styled.form`
   }
 `
 
-const AddVoter = ({ election }: { election: Election }) => {
+const AddVoter = ({
+  election,
+  definition,
+}: {
+  election: Election
+  definition: ElectionDefinition
+}) => {
   const addVoter = useAddVoter(election.id)
   const { register, handleSubmit, reset, watch } = useForm<NewVoter>()
 
@@ -374,7 +390,7 @@ const AddVoter = ({ election }: { election: Election }) => {
         <label>Precinct: </label>
         <select {...register('precinct')}>
           <option />
-          {election.definition.precincts.map(precinct => (
+          {definition.precincts.map(precinct => (
             <option key={precinct.id} value={precinct.id}>
               {precinct.name} ({precinct.id})
             </option>
@@ -383,7 +399,7 @@ const AddVoter = ({ election }: { election: Election }) => {
         <label>Ballot style: </label>
         <select {...register('ballotStyle')}>
           {!watch('precinct') && <option />}
-          {election.definition.ballotStyles
+          {definition.ballotStyles
             .filter(
               ballotStyle =>
                 !watch('precinct') ||
@@ -410,13 +426,19 @@ const ElectionScreen = () => {
   const { electionId } = useParams<{ electionId: string }>()
   const { voterId } = useQueryParams()
   const election = useElection(electionId)
+  const electionDefinition = useElectionDefinition(
+    election.data && election.data.definitionHash
+  )
+  const [voterFilters, setVoterFilters] = useState<VoterFilters>({})
+  const voters = useVoters(electionId, voterFilters)
+  const selectedVoter = useVoter(electionId, voterId)
   const uploadVoterFile = useUploadVoterFile(electionId)
   const { register, handleSubmit, reset } = useForm<{
     voterFile: FileList
   }>()
   const deleteVoter = useDeleteVoter(electionId)
 
-  if (!election.isSuccess) return null
+  if (!election.isSuccess || !electionDefinition.isSuccess) return null
 
   const onSubmitVoterFile = async ({ voterFile }: { voterFile: FileList }) => {
     try {
@@ -436,8 +458,8 @@ const ElectionScreen = () => {
     }
   }
 
-  const { definition, voters } = election.data
-  const selectedVoter = voterId && voters.find(({ id }) => id === voterId)
+  const { voterCount } = election.data
+  const definition = electionDefinition.data
 
   const prettyActivityName = (activityName: string) =>
     ({
@@ -470,11 +492,56 @@ const ElectionScreen = () => {
               </div>
             </form>
           </Card>
-          <AddVoter election={election.data} />
+          <AddVoter election={election.data} definition={definition} />
         </div>
-        {voters.length > 0 && (
+        {voterCount > 0 && (
           <>
-            <p>Total voters: {voters.length}</p>
+            <p>
+              Total voters: {voterCount}
+              <AnchorButton
+                href={`/api/elections/${electionId}/voters/export`}
+                style={{ marginLeft: '15px' }}
+              >
+                Export voters
+              </AnchorButton>
+              <AnchorButton
+                href={`/api/elections/${electionId}/activities/export`}
+                style={{ marginLeft: '10px' }}
+              >
+                Export activity log
+              </AnchorButton>
+            </p>
+            <div style={{ marginBottom: '10px' }}>
+              <input
+                type="search"
+                placeholder="Search by voter ID or email"
+                value={voterFilters.search || ''}
+                onChange={event =>
+                  setVoterFilters({
+                    ...voterFilters,
+                    search: event.target.value,
+                  })
+                }
+                style={{ width: '20em' }}
+              />
+              <select
+                value={voterFilters.precinct || ''}
+                onChange={event =>
+                  setVoterFilters({
+                    ...voterFilters,
+                    precinct: event.target.value || undefined,
+                  })
+                }
+                style={{ marginLeft: '10px' }}
+              >
+                <option value="">All precincts</option>
+                {definition.precincts.map(precinct => (
+                  <option key={precinct.id} value={precinct.id}>
+                    {precinct.name} ({precinct.id})
+                  </option>
+                ))}
+              </select>
+            </div>
             <FlexTable scrollable style={{ height: '200px' }}>
               <thead>
                 <tr>
@@ -488,58 +555,64 @@ const ElectionScreen = () => {
                 </tr>
               </thead>
               <tbody>
-                {voters.map(voter => (
-                  <tr key={voter.id}>
-                    <td>{voter.externalId}</td>
-                    <td>{voter.email}</td>
-                    <td>
-                      {
-                        getPrecinctById({
-                          election: definition,
-                          precinctId: voter.precinct,
-                        })!.name
-                      }{' '}
-                      ({voter.precinct})
-                    </td>
-                    <td>{voter.ballotStyle}</td>
-                    <td>
-                      {voter.wasManuallyAdded
-                        ? 'Individually added'
-                        : 'Voter file'}
-                    </td>
-                    <td
-                      style={{
-                        display: 'flex',
-                        justifyContent: 'space-between',
-                        alignItems: 'baseline',
-                      }}
-                    >
-                      {(() => {
-                        if (voter.activities.length === 0) return null
-                        return (
-                          <LinkButton
-                            to={`/elections/${electionId}?voterId=${voter.id}`}
-                          >
-                            {prettyActivityName(
-                              voter.activities[voter.activities.length - 1]
-                                .activityName
-                            )}
-                          </LinkButton>
-                        )
-                      })()}
-                    </td>
-                    <td>
-                      <Button onClick={() => onClickDeleteVoter(voter.id)}>
-                        Delete
-                      </Button>
-                    </td>
-                  </tr>
-                ))}
+                {voters.isSuccess &&
+                  voters.data.pages.flatMap(page =>
+                    page.voters.map(voter => (
+                      <tr key={voter.id}>
+                        <td>{voter.externalId}</td>
+                        <td>{voter.email}</td>
+                        <td>
+                          {
+                            getPrecinctById({
+                              election: definition,
+                              precinctId: voter.precinct,
+                            })!.name
+                          }{' '}
+                          ({voter.precinct})
+                        </td>
+                        <td>{voter.ballotStyle}</td>
+                        <td>
+                          {voter.wasManuallyAdded
+                            ? 'Individually added'
+                            : 'Voter file'}
+                        </td>
+                        <td
+                          style={{
+                            display: 'flex',
+                            justifyContent: 'space-between',
+                            alignItems: 'baseline',
+                          }}
+                        >
+                          {voter.lastActivityName && (
+                            <LinkButton
+                              to={`/elections/${electionId}?voterId=${voter.id}`}
+                            >
+                              {prettyActivityName(voter.lastActivityName)}
+                            </LinkButton>
+                          )}
+                        </td>
+                        <td>
+                          <Button onClick={() => onClickDeleteVoter(voter.id)}>
+                            Delete
+                          </Button>
+                        </td>
+                      </tr>
+                    ))
+                  )}
               </tbody>
             </FlexTable>
+            {voters.hasNextPage && (
+              <Button
+                onClick={() => voters.fetchNextPage()}
+                disabled={voters.isFetchingNextPage}
+                style={{ marginTop: '15px' }}
+              >
+                Load more voters
+              </Button>
+            )}
           </>
         )}
-        {selectedVoter && (
+        {selectedVoter.isSuccess && (
           <Modal
             appElement={document.getElementById('root')!}
             isOpen
@@ -563,7 +636,7 @@ const ElectionScreen = () => {
           >
             <div>
               <h2>
-                {selectedVoter.externalId} - {selectedVoter.email}
+                {selectedVoter.data.externalId} - {selectedVoter.data.email}
               </h2>
               <h3>Voter Activity</h3>
               <div
@@ -573,7 +646,7 @@ const ElectionScreen = () => {
                   gridGap: '20px',
                 }}
               >
-                {selectedVoter.activities.map(activity => (
+                {selectedVoter.data.activities.map(activity => (
                   <>
                     <strong>{prettyActivityName(activity.activityName)}</strong>
                     <span>{new Date(activity.timestamp).toLocaleString()}</span>
@@ -593,7 +666,7 @@ const ElectionScreen = () => {
           </Modal>
         )}
       </Section>
-      {election.data.voters.length > 0 && (
+      {voterCount > 0 && (
         <SendBallots election={election.data} />
       )}
     </div>
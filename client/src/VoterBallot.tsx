@@ -23,13 +23,20 @@ import getPrinter from './bmd/utils/printer'
 
 import FocusManager from './bmd/components/FocusManager'
 import { getBallotStyle, getContests } from './bmd/utils/election'
-import { useRecordVoterActivity, VoterUser } from './api'
+import {
+  useElectionDefinition,
+  useRecordVoterActivity,
+  VoterUser,
+} from './api'
 
 // eslint-disable-next-line @typescript-eslint/explicit-module-boundary-types
 const VoterBallot = ({ voter }: { voter: VoterUser }) => {
   const [votes, setVotes] = useState({})
   const [hasPrinted, setHasPrinted] = useState(false)
   const recordVoterActivity = useRecordVoterActivity(voter.election.id)
+  const electionDefinition = useElectionDefinition(
+    voter.election.definitionHash
+  )
 
   const screenReader = new AriaScreenReader(
     new SpeechSynthesisTextToSpeech(memoize(getUSEnglishVoice))
@@ -89,7 +96,9 @@ const VoterBallot = ({ voter }: { voter: VoterUser }) => {
     [screenReader]
   )
 
-  const election = voter.election.definition as Election
+  if (!electionDefinition.isSuccess) return null
+
+  const election = electionDefinition.data as Election
   const ballotStyle = getBallotStyle({
     election,
     ballotStyleId: voter.ballotStyle,
@@ -3,6 +3,7 @@ import React from 'react'
 import {
   QueryClient,
   QueryClientProvider,
+  useInfiniteQuery,
   useMutation,
   useQuery,
 } from 'react-query'
@@ -59,11 +60,13 @@ export interface VoterUser {
 
 export interface ElectionBase {
   id: string
-  definition: ElectionDefinition
+  // Fetch the definition itself with useElectionDefinition
+  definitionHash: string
 }
 
 export interface Election extends ElectionBase {
-  voters: Voter[]
+  voterCount: number
+  emailedVoterCount: number
 }
 
 export interface Voter {
@@ -74,9 +77,24 @@ export interface Voter {
   ballotStyle: string
   ballotEmailLastSentAt: string
   wasManuallyAdded: boolean
+}
+
+export interface VoterSummary extends Voter {
+  lastActivityName: string | null
+  lastActivityAt: string | null
+  loginCount: number
+  firstBallotPrintedAt: string | null
+}
+
+export interface VoterDetails extends Voter {
   activities: VoterActivity[]
 }
 
+export interface VotersPage {
+  voters: VoterSummary[]
+  nextCursor: string | null
+}
+
 export interface VoterActivity {
   voterId: string
   activityName: string
@@ -84,10 +102,32 @@ export interface VoterActivity {
   info: object | null // eslint-disable-line @typescript-eslint/ban-types
 }
 
+// Definitions are addressed by their hash, so they never change and only
+// need to be fetched once.
+export const useElectionDefinition = (definitionHash?: string) =>
+  useQuery(
+    ['definitions', definitionHash],
+    () => apiFetch<ElectionDefinition>(`/api/definitions/${definitionHash}`),
+    { enabled: !!definitionHash, staleTime: Infinity }
+  )
+
 export const useAuth = () => useQuery('auth', () => apiFetch<Auth>('/auth/me'))
 
+export interface ElectionSummary {
+  id: string
+  title: string
+  date: string
+  county: { id: string; name: string }
+  precinctCount: number
+  ballotStyleCount: number
+  contestCount: number
+  voterCount: number
+}
+
 export const useElections = () =>
-  useQuery('elections', () => apiFetch<ElectionBase[]>('/api/elections'))
+  useQuery('elections', () =>
+    apiFetch<ElectionSummary[]>('/api/elections?summary=true')
+  )
 
 export const useCreateElection = () => {
   const createElection = async ({ definition }: { definition: File }) => {
@@ -123,14 +163,140 @@ export const useElection = (electionId: string) =>
     apiFetch<Election>(`/api/elections/${electionId}`)
   )
 
+export interface VoterCounts {
+  voters: number
+  emailed: number
+  loggedIn: number
+  printed: number
+}
+
+export interface ElectionStats {
+  totals: VoterCounts
+  byPrecinct: { [precinctId: string]: VoterCounts }
+  byBallotStyle: { [ballotStyleId: string]: VoterCounts }
+  // Last activity name -> number of voters
+  byLastActivity: { [activityName: string]: number }
+}
+
+export const useElectionStats = (electionId: string) =>
+  useQuery(['elections', electionId, 'stats'], () =>
+    apiFetch<ElectionStats>(`/api/elections/${electionId}/stats`)
+  )
+
+export interface VoterFilters {
+  precinct?: string
+  ballotStyle?: string
+  // Matches the start of the voter's email or external id
+  search?: string
+  wasManuallyAdded?: boolean
+  emailSent?: boolean
+  hasActivity?: string
+}
+
+// Voters are filtered on the server and loaded a page at a time, in order of
+// external id
+export const useVoters = (electionId: string, filters: VoterFilters = {}) =>
+  useInfiniteQuery(
+    ['elections', electionId, 'voters', filters],
+    ({ pageParam }) => {
+      const params = new URLSearchParams()
+      Object.entries(filters).forEach(([name, value]) => {
+        if (value !== undefined && value !== '') params.set(name, `${value}`)
+      })
+      if (pageParam) params.set('after', pageParam)
+      return apiFetch<VotersPage>(
+        `/api/elections/${electionId}/voters?${params}`
+      )
+    },
+    { getNextPageParam: lastPage => lastPage.nextCursor || undefined }
+  )
+
+export const useVoter = (electionId: string, voterId?: string) =>
+  useQuery(
+    ['elections', electionId, 'voters', voterId],
+    () =>
+      apiFetch<VoterDetails>(`/api/elections/${electionId}/voters/${voterId}`),
+    { enabled: !!voterId }
+  )
+
+export interface VoterFileJob {
+  id: string
+  status: 'QUEUED' | 'PROCESSING' | 'PROCESSED' | 'ERRORED'
+  startedAt: string | null
+  completedAt: string | null
+  rowsProcessed: number
+  result: VoterFileChanges | VoterFileCheck | null
+  error: string | null
+}
+
+export interface VoterFileChanges {
+  added: number
+  changed: number
+  removed: number
+}
+
+// The result of uploading a voter file with validateOnly
+export interface VoterFileCheck {
+  valid: boolean
+  errorCount: number
+  truncated: boolean
+  errors: { [errorType: string]: string[] }
+}
+
+const sleep = (milliseconds: number) =>
+  new Promise(resolve => setTimeout(resolve, milliseconds))
+
+// Stop waiting for a background job if it hasn't made any progress in this
+// long (e.g. because no worker is running)
+const JOB_STALLED_TIMEOUT_MS = 5 * 60 * 1000
+
 export const useUploadVoterFile = (electionId: string) => {
-  const uploadVoterFile = ({ voterFile }: { voterFile: File }) => {
+  // Voter files are processed in the background, so we poll the job until
+  // it's done
+  const waitForJob = async (
+    jobId: string,
+    lastProgress = { job: '', at: Date.now() }
+  ): Promise<VoterFileJob> => {
+    const job = await apiFetch<VoterFileJob>(
+      `/api/elections/${electionId}/voters/file/jobs/${jobId}`
+    )
+    if (job.status === 'ERRORED') throw new Error(job.error!)
+    if (job.status === 'PROCESSED') return job
+
+    const progress = `${job.status} ${job.rowsProcessed}`
+    const madeProgress = progress !== lastProgress.job
+    if (
+      !madeProgress &&
+      Date.now() - lastProgress.at > JOB_STALLED_TIMEOUT_MS
+    ) {
+      throw new Error('Timed out waiting for the voter file to be processed.')
+    }
+    await sleep(1000)
+    return waitForJob(
+      jobId,
+      madeProgress ? { job: progress, at: Date.now() } : lastProgress
+    )
+  }
+
+  const uploadVoterFile = async ({
+    voterFile,
+    validateOnly = false,
+  }: {
+    voterFile: File
+    validateOnly?: boolean
+  }) => {
     const body = new FormData()
     body.append('voterFile', voterFile)
-    return apiFetch(`/api/elections/${electionId}/voters/file`, {
-      method: 'PUT',
-      body,
-    })
+    const { jobId } = await apiFetch<{ jobId: string }>(
+      `/api/elections/${electionId}/voters/file${
+        validateOnly ? '?validateOnly=true' : ''
+      }`,
+      {
+        method: 'PUT',
+        body,
+      }
+    )
+    return waitForJob(jobId)
   }
 
   return useMutation(uploadVoterFile, {
@@ -169,19 +335,54 @@ export const useDeleteVoter = (electionId: string) => {
   })
 }
 
+const newIdempotencyKey = () =>
+  Array.from(window.crypto.getRandomValues(new Uint8Array(16)), byte =>
+    byte.toString(16).padStart(2, '0')
+  ).join('')
+
 export const useSendBallotEmails = (electionId: string) => {
-  const sendBallotEmails = (body: { voterIds: string[]; template: string }) =>
+  // Each send has an idempotency key, which we keep until the send succeeds.
+  // If it fails partway, retrying (automatically or by sending again) only
+  // sends to voters who haven't been sent ballots by it yet.
+  const idempotencyKey = React.useRef(newIdempotencyKey())
+
+  // Sends to all voters in the election unless voterIds are given
+  const sendBallotEmails = (body: { voterIds?: string[]; template: string }) =>
     apiFetch(`/api/elections/${electionId}/emails`, {
       method: 'POST',
-      body: JSON.stringify(body),
+      body: JSON.stringify({ ...body, idempotencyKey: idempotencyKey.current }),
       headers: { 'Content-type': 'application/json' },
     })
 
   return useMutation(sendBallotEmails, {
-    onSuccess: () => queryClient.invalidateQueries(['elections', electionId]),
+    retry: 3,
+    onSuccess: () => {
+      idempotencyKey.current = newIdempotencyKey()
+      queryClient.invalidateQueries(['elections', electionId])
+    },
   })
 }
 
+export interface BallotEmailCounts {
+  queued: number
+  sent: number
+  failed: number
+}
+
+// Ballot emails are queued and sent in the background, so we poll the counts
+// until there are none left in the queue
+export const useBallotEmailCounts = (electionId: string) => {
+  const [hasQueuedEmails, setHasQueuedEmails] = React.useState(false)
+  return useQuery(
+    ['elections', electionId, 'emails'],
+    () => apiFetch<BallotEmailCounts>(`/api/elections/${electionId}/emails`),
+    {
+      refetchInterval: hasQueuedEmails ? 2000 : false,
+      onSuccess: counts => setHasQueuedEmails(counts.queued > 0),
+    }
+  )
+}
+
 export const useRecordVoterActivity = (electionId: string) => {
   const recordVoterActivity = ({ voterId, ...activity }: VoterActivity) =>
     apiFetch(`/api/elections/${electionId}/voters/${voterId}/activity`, {
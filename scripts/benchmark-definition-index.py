@@ -0,0 +1,55 @@
+# pylint: disable=invalid-name
+import sys
+import time
+from typing import Any, Dict, List
+
+from server.voter_file import (
+    index_election_definition,
+    validate_voter_against_definition,
+)
+from scripts.synthetic_election import (
+    SyntheticVoter,
+    generate_election_definition,
+    generate_voters,
+)
+
+
+def validate_with_scans(definition: Dict[str, Any], voters: List[SyntheticVoter]):
+    # The per-voter linear scans that upload_voter_file used to do
+    for _, _, precinct, ballot_style_id in voters:
+        assert any(p["id"] == precinct for p in definition["precincts"])
+        ballot_style = next(
+            b for b in definition["ballotStyles"] if b["id"] == ballot_style_id
+        )
+        assert precinct in ballot_style["precincts"]
+
+
+def validate_with_index(definition: Dict[str, Any], voters: List[SyntheticVoter]):
+    index = index_election_definition(definition)
+    for _, email, precinct, ballot_style in voters:
+        validate_voter_against_definition(index, email, precinct, ballot_style)
+
+
+def time_it(validate, definition, voters) -> float:
+    start = time.perf_counter()
+    validate(definition, voters)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(
+            "Usage: FLASK_ENV=development python -m scripts.benchmark-definition-index"
+            " <num_voters> <num_precincts> <num_ballot_styles>"
+        )
+        sys.exit(1)
+
+    num_voters, num_precincts, num_ballot_styles = map(int, sys.argv[1:])
+    definition = generate_election_definition(num_precincts, num_ballot_styles)
+    voters = list(generate_voters(num_voters, definition))
+
+    scan_seconds = time_it(validate_with_scans, definition, voters)
+    index_seconds = time_it(validate_with_index, definition, voters)
+    print(f"linear scans: {scan_seconds:.3f}s")
+    print(f"indexed:      {index_seconds:.3f}s")
+    print(f"speedup:      {scan_seconds / index_seconds:.1f}x")
@@ -0,0 +1,76 @@
+# pylint: disable=invalid-name,wrong-import-position,ungrouped-imports
+import os
+import sys
+import time
+import secrets
+from typing import List
+
+import requests
+
+from scripts.fake_mailgun import FakeMailgun
+
+# Compares sending ballot emails one Mailgun API call at a time, each on a new
+# connection (how we used to send), with our pooled, concurrent sending, using
+# a fake Mailgun server that waits before responding to simulate latency.
+# Note that the fake server doesn't use TLS, so this understates how much
+# reusing connections saves.
+
+if len(sys.argv) != 4:
+    print(
+        "Usage: FLASK_ENV=development python -m scripts.benchmark-email-sending"
+        " <num_emails> <latency_ms> <concurrency>"
+    )
+    sys.exit(1)
+
+num_emails, latency_ms, concurrency = map(int, sys.argv[1:])
+fake_mailgun = FakeMailgun(latency_seconds=latency_ms / 1000)
+fake_mailgun.start()
+# Config is read on import, so set it before importing the server code
+os.environ["MAILGUN_API_URL"] = fake_mailgun.api_url
+os.environ["MAILGUN_DOMAIN"] = "rbm.example.com"
+os.environ["MAILGUN_API_KEY"] = "fake-api-key"
+os.environ["EMAIL_SEND_CONCURRENCY"] = str(concurrency)
+
+from scripts.email_batches import send_ballot_emails
+from server.email_transport import MAILGUN_BATCH_SIZE, BallotEmail, MailgunTransport
+
+
+def send_sequentially(emails: List[BallotEmail], template: str):
+    # Send each batch with a one-off requests.post, one after another
+    transport = MailgunTransport()
+    transport.session = requests  # type: ignore
+    for start in range(0, len(emails), MAILGUN_BATCH_SIZE):
+        transport.send_batch(emails[start : start + MAILGUN_BATCH_SIZE], template)
+
+
+def send_pooled(emails: List[BallotEmail], template: str):
+    send_ballot_emails(emails, template, MailgunTransport())
+
+
+def time_it(send, emails: List[BallotEmail]) -> float:
+    fake_mailgun.messages.clear()
+    start = time.perf_counter()
+    send(emails, "Here is your ballot:")
+    seconds = time.perf_counter() - start
+    assert sum(len(message["to"]) for message in fake_mailgun.messages) == len(emails)
+    return seconds
+
+
+if __name__ == "__main__":
+    ballot_emails = [
+        BallotEmail(f"voter-{i}@example.com", secrets.token_hex(16))
+        for i in range(num_emails)
+    ]
+    num_calls = -(-num_emails // MAILGUN_BATCH_SIZE)
+    sequential_seconds = time_it(send_sequentially, ballot_emails)
+    pooled_seconds = time_it(send_pooled, ballot_emails)
+    print(f"{num_emails} emails in {num_calls} API calls")
+    print(
+        f"sequential:     {sequential_seconds:.2f}s"
+        f" ({num_emails / sequential_seconds:.0f} emails/s)"
+    )
+    print(
+        f"pooled ({concurrency} at once): {pooled_seconds:.2f}s"
+        f" ({num_emails / pooled_seconds:.0f} emails/s)"
+    )
+    print(f"speedup:        {sequential_seconds / pooled_seconds:.1f}x")
@@ -0,0 +1,156 @@
+# pylint: disable=invalid-name,wrong-import-position
+"""
+Send ballot emails to the voters of a synthetic election through each email
+transport (see server/email_transport.py) and compare how long they take.
+Emails go through the same path as a real send: queue_ballot_emails queues
+them in the outbox, as the API does, and send_due_ballot_emails sends them in
+concurrent batches, as the worker does.
+
+Nothing leaves this machine: Mailgun is a local fake server and the maildir is
+a temporary directory. SMTP is only included if SMTP_HOST is set (e.g. to a
+local MailHog). Sends aren't rate limited unless EMAIL_SEND_RATE is set.
+
+Runs against the database configured for FLASK_ENV (e.g. your local
+PostgreSQL), creating a throwaway organization that is deleted afterwards.
+
+Usage: FLASK_ENV=development python -m scripts.benchmark-email-transports
+    <num_voters> <latency_ms>
+"""
+import os
+import sys
+import time
+import uuid
+import tempfile
+from typing import Dict, Tuple
+
+from scripts.fake_mailgun import FakeMailgun
+from scripts.synthetic_election import generate_election_definition, generate_voters
+
+if len(sys.argv) != 3:
+    print(__doc__)
+    sys.exit(1)
+
+num_voters, latency_ms = map(int, sys.argv[1:])
+fake_mailgun = FakeMailgun(latency_seconds=latency_ms / 1000)
+fake_mailgun.start()
+# Config is read on import, so set it before importing the server code
+os.environ["MAILGUN_API_URL"] = fake_mailgun.api_url
+os.environ["MAILGUN_DOMAIN"] = "rbm.example.com"
+os.environ["MAILGUN_API_KEY"] = "fake-api-key"
+os.environ["EMAIL_TRANSPORT"] = "memory"
+os.environ.setdefault("EMAIL_SEND_RATE", str(10 ** 9))
+
+from server import ballot_email
+from server.ballot_email import (
+    SendRateLimiter,
+    queue_ballot_emails,
+    send_due_ballot_emails,
+)
+from server.config import EMAIL_SEND_CONCURRENCY, EMAIL_SEND_RATE, SMTP_HOST
+from server.email_transport import (
+    EmailTransport,
+    MaildirTransport,
+    MailgunTransport,
+    MemoryTransport,
+    SmtpTransport,
+)
+from server.models import (
+    BallotEmailMessage,
+    BallotEmailStatus,
+    Election,
+    Organization,
+    Voter,
+    db_session,
+    election_definition_hash,
+    election_definition_summary,
+)
+from server.voter_file import reconcile_voters
+
+
+def create_election(organization_id: str) -> str:
+    definition = generate_election_definition(num_precincts=10, num_ballot_styles=5)
+    election = Election(
+        id=str(uuid.uuid4()),
+        organization_id=organization_id,
+        definition=definition,
+        definition_hash=election_definition_hash(definition),
+        definition_summary=election_definition_summary(definition),
+    )
+    db_session.add(election)
+    db_session.commit()
+    reconcile_voters(
+        election.id,
+        (voter._asdict() for voter in generate_voters(num_voters, definition)),
+    )
+    db_session.commit()
+    return str(election.id)
+
+
+def benchmark(election_id: str, transport: EmailTransport) -> Tuple[float, float]:
+    # The send path uses the configured transport, so swap in the one we're
+    # benchmarking
+    ballot_email.email_transport = transport
+    ballot_email.send_rate_limiter = SendRateLimiter(
+        EMAIL_SEND_RATE, transport.batch_size
+    )
+
+    start = time.perf_counter()
+    queued_count = queue_ballot_emails(
+        Voter.query.filter_by(election_id=election_id),
+        "Here is your ballot:",
+        idempotency_key=str(uuid.uuid4()),
+    )
+    queue_seconds = time.perf_counter() - start
+    assert queued_count == num_voters, (queued_count, num_voters)
+
+    start = time.perf_counter()
+    send_due_ballot_emails()
+    send_seconds = time.perf_counter() - start
+
+    unsent_count = BallotEmailMessage.query.filter(
+        BallotEmailMessage.election_id == election_id,
+        BallotEmailMessage.status != BallotEmailStatus.SENT.value,
+    ).count()
+    assert unsent_count == 0, f"{unsent_count} emails weren't sent"
+    return queue_seconds, send_seconds
+
+
+def main():
+    organization = Organization(id=str(uuid.uuid4()), name=f"Benchmark {uuid.uuid4()}")
+    db_session.add(organization)
+    db_session.commit()
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            transports: Dict[str, EmailTransport] = {
+                f"memory ({latency_ms}ms latency)": MemoryTransport(
+                    latency_seconds=latency_ms / 1000
+                ),
+                f"mailgun (fake, {latency_ms}ms latency)": MailgunTransport(),
+                "maildir": MaildirTransport(os.path.join(temp_dir, "maildir")),
+            }
+            if SMTP_HOST:
+                transports[f"smtp ({SMTP_HOST})"] = SmtpTransport()
+
+            print(
+                f"Sending to {num_voters} voters,"
+                f" {EMAIL_SEND_CONCURRENCY} batches at a time"
+            )
+            for name, transport in transports.items():
+                # Use a fresh election for each transport, so each one sends
+                # every email
+                election_id = create_election(organization.id)
+                queue_seconds, send_seconds = benchmark(election_id, transport)
+                print(
+                    f"{name}: queued in {queue_seconds:.2f}s, sent in"
+                    f" {send_seconds:.2f}s ({num_voters / send_seconds:.0f} emails/s,"
+                    f" batches of {transport.batch_size})"
+                )
+    finally:
+        db_session.rollback()
+        db_session.delete(organization)
+        db_session.commit()
+
+
+if __name__ == "__main__":
+    main()
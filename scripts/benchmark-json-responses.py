@@ -0,0 +1,98 @@
+# pylint: disable=invalid-name
+import sys
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from flask import Flask, Response, jsonify
+
+from server.models import serialize_election_definition
+from server.responses import cached_json_response, json_response
+from scripts.synthetic_election import generate_election_definition, generate_voters
+
+app = Flask(__name__)
+
+
+def definition_before(definition: Dict[str, Any]) -> Response:
+    # What get_election_definition used to do for every request
+    return Response(
+        serialize_election_definition(definition), mimetype="application/json"
+    )
+
+
+def definition_after(definition: Dict[str, Any]) -> Response:
+    return cached_json_response(
+        "benchmark", lambda: serialize_election_definition(definition)
+    )
+
+
+def voters_page_before(voters: List[Dict[str, Any]]) -> Response:
+    return jsonify(voters=voters, nextCursor=None)
+
+
+def voters_page_after(voters: List[Dict[str, Any]]) -> Response:
+    return json_response(dict(voters=voters, nextCursor=None))
+
+
+def time_it(
+    respond: Callable[[Any], Response], data: Any, accept_encoding: str, runs: int
+):
+    with app.test_request_context(headers={"Accept-Encoding": accept_encoding}):
+        start = time.perf_counter()
+        for _ in range(runs):
+            response = respond(data)
+        seconds = (time.perf_counter() - start) / runs
+        return seconds, len(response.get_data()), response.content_encoding
+
+
+def compare(name: str, before, after, data: Any, runs: int):
+    before_seconds, before_bytes, _ = time_it(before, data, "", runs)
+    print(f"{name}: before {before_seconds * 1000:.2f}ms, {before_bytes} bytes")
+    for accept_encoding in ["", "gzip", "gzip, br"]:
+        after_seconds, after_bytes, encoding = time_it(
+            after, data, accept_encoding, runs
+        )
+        print(
+            f"  after ({encoding or 'identity'}):"
+            f" {after_seconds * 1000:.2f}ms, {after_bytes} bytes"
+            f" ({before_seconds / after_seconds:.1f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print(
+            "Usage: FLASK_ENV=development python -m scripts.benchmark-json-responses"
+            " <num_precincts> <num_ballot_styles> <voters_page_size> <runs>"
+        )
+        sys.exit(1)
+
+    num_precincts, num_ballot_styles, page_size, num_runs = map(int, sys.argv[1:])
+    election_definition = generate_election_definition(num_precincts, num_ballot_styles)
+    voters_page = [
+        dict(
+            id=str(uuid.uuid4()),
+            externalId=external_id,
+            email=email,
+            precinct=precinct,
+            ballotStyle=ballot_style,
+            ballotEmailLastSentAt=None,
+            wasManuallyAdded=False,
+            lastActivityName=None,
+            lastActivityAt=None,
+            loginCount=0,
+            firstBallotPrintedAt=None,
+        )
+        for external_id, email, precinct, ballot_style in generate_voters(
+            page_size, election_definition
+        )
+    ]
+
+    compare(
+        "election definition",
+        definition_before,
+        definition_after,
+        election_definition,
+        num_runs,
+    )
+    compare("voters page", voters_page_before, voters_page_after, voters_page, num_runs)
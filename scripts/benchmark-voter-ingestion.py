@@ -0,0 +1,145 @@
+# pylint: disable=invalid-name
+"""
+Benchmark each stage of voter file ingestion (parsing, validation and writing
+to the database) for synthetic elections and voter files of different sizes.
+
+Runs against the database configured for FLASK_ENV (e.g. your local
+PostgreSQL), creating a throwaway organization that is deleted afterwards.
+
+Usage: FLASK_ENV=development python -m scripts.benchmark-voter-ingestion
+    [--voters 1000 10000 100000 1000000] [--precincts 1000]
+    [--ballot-styles 200] [--formats csv xml]
+"""
+import io
+import time
+import uuid
+import argparse
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+from werkzeug.datastructures import FileStorage
+
+from server.models import (
+    Election,
+    Organization,
+    db_session,
+    election_definition_hash,
+    election_definition_summary,
+)
+from server.voter_file import (
+    parse_voter_file,
+    index_election_definition,
+    validate_voters,
+    reconcile_voters,
+)
+from scripts.synthetic_election import (
+    generate_election_definition,
+    generate_voters,
+    generate_csv_voter_file,
+    generate_xml_voter_file,
+)
+
+MIMETYPES = {"csv": "text/csv", "xml": "application/xml"}
+GENERATORS = {"csv": generate_csv_voter_file, "xml": generate_xml_voter_file}
+
+
+def measure(stage: Callable[[], Any]) -> Tuple[Any, float, int]:
+    # Run the stage once untraced to time it, and again with tracemalloc on to
+    # find its peak memory use, since tracing slows everything down.
+    start = time.perf_counter()
+    stage()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = stage()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak_bytes
+
+
+def create_election(organization_id: str, definition: dict) -> str:
+    election = Election(
+        id=str(uuid.uuid4()),
+        organization_id=organization_id,
+        definition=definition,
+        definition_hash=election_definition_hash(definition),
+        definition_summary=election_definition_summary(definition),
+    )
+    db_session.add(election)
+    db_session.commit()
+    return str(election.id)
+
+
+def benchmark(
+    organization_id: str, definition: dict, num_voters: int, file_format: str
+) -> List[Tuple[str, float, int]]:
+    contents = GENERATORS[file_format](generate_voters(num_voters, definition))
+
+    def parse():
+        return list(
+            parse_voter_file(
+                FileStorage(
+                    stream=io.BytesIO(contents),
+                    filename=f"voters.{file_format}",
+                    content_type=MIMETYPES[file_format],
+                )
+            )
+        )
+
+    voters, parse_seconds, parse_peak = measure(parse)
+
+    def validate():
+        for _ in validate_voters(voters, index_election_definition(definition), {}):
+            pass
+
+    _, validate_seconds, validate_peak = measure(validate)
+
+    # Write to a fresh election each time so both runs insert every voter
+    def write():
+        election_id = create_election(organization_id, definition)
+        reconcile_voters(election_id, (voter for _, voter in voters))
+        db_session.commit()
+
+    _, write_seconds, write_peak = measure(write)
+
+    return [
+        ("parse", parse_seconds, parse_peak),
+        ("validate", validate_seconds, validate_peak),
+        ("db write", write_seconds, write_peak),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--voters", type=int, nargs="+", default=[1000, 10000, 100000, 1000000]
+    )
+    parser.add_argument("--precincts", type=int, default=1000)
+    parser.add_argument("--ballot-styles", type=int, default=200)
+    parser.add_argument("--formats", nargs="+", default=["csv", "xml"])
+    args = parser.parse_args()
+
+    definition = generate_election_definition(args.precincts, args.ballot_styles)
+    organization = Organization(id=str(uuid.uuid4()), name=f"Benchmark {uuid.uuid4()}")
+    db_session.add(organization)
+    db_session.commit()
+
+    print(f"{args.precincts} precincts, {args.ballot_styles} ballot styles")
+    print(f"{'format':>6} {'voters':>9} {'stage':>9} {'seconds':>9} {'peak MB':>9}")
+    try:
+        for file_format in args.formats:
+            for num_voters in args.voters:
+                for stage, seconds, peak_bytes in benchmark(
+                    organization.id, definition, num_voters, file_format
+                ):
+                    print(
+                        f"{file_format:>6} {num_voters:>9} {stage:>9}"
+                        f" {seconds:>9.3f} {peak_bytes / 1024 / 1024:>9.1f}"
+                    )
+    finally:
+        db_session.rollback()
+        db_session.delete(organization)
+        db_session.commit()
+
+
+if __name__ == "__main__":
+    main()
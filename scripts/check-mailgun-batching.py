@@ -0,0 +1,55 @@
+# pylint: disable=invalid-name,wrong-import-position,ungrouped-imports
+import os
+import sys
+import secrets
+
+from scripts.fake_mailgun import FakeMailgun
+
+# Checks that send_ballot_emails splits emails into Mailgun batches and gives
+# each voter their own ballot URL, by sending to a fake Mailgun server.
+
+fake_mailgun = FakeMailgun()
+fake_mailgun.start()
+# Config is read on import, so set it before importing the server code
+os.environ["MAILGUN_API_URL"] = fake_mailgun.api_url
+os.environ["MAILGUN_DOMAIN"] = "rbm.example.com"
+os.environ["MAILGUN_API_KEY"] = "fake-api-key"
+
+from scripts.email_batches import send_ballot_emails
+from server.email_transport import (
+    MAILGUN_BATCH_SIZE,
+    BallotEmail,
+    MailgunTransport,
+    ballot_url,
+)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(
+            "Usage: FLASK_ENV=development python -m scripts.check-mailgun-batching"
+            " <num_emails>"
+        )
+        sys.exit(1)
+
+    num_emails = int(sys.argv[1])
+    emails = [
+        BallotEmail(f"voter-{i}@example.com", secrets.token_hex(16))
+        for i in range(num_emails)
+    ]
+    send_ballot_emails(emails, "Here is your ballot:", MailgunTransport())
+
+    messages = fake_mailgun.messages
+    expected_batches = -(-num_emails // MAILGUN_BATCH_SIZE)
+    assert len(messages) == expected_batches, (len(messages), expected_batches)
+    sent_ballot_urls = {}
+    for message in messages:
+        assert message["domain"] == "rbm.example.com"
+        assert len(message["to"]) <= MAILGUN_BATCH_SIZE
+        assert message["text"] == "Here is your ballot:\n%recipient.ballot_url%"
+        assert set(message["to"]) == set(message["recipient_variables"])
+        for voter_email, variables in message["recipient_variables"].items():
+            sent_ballot_urls[voter_email] = variables["ballot_url"]
+    assert sent_ballot_urls == {
+        email.voter_email: ballot_url(email.ballot_url_token) for email in emails
+    }
+    print(f"Sent {num_emails} emails in {len(messages)} batches")
@@ -0,0 +1,110 @@
+# pylint: disable=invalid-name,wrong-import-position
+import sys
+import uuid
+from typing import Dict
+
+from sqlalchemy import event
+
+# Checks that the election and voter endpoints run the same number of SQL
+# statements no matter how many voters an election has (i.e. no N+1 queries),
+# by counting statements for a synthetic election with N and then 10N voters.
+# Runs against the database configured for FLASK_ENV, creating a throwaway
+# organization that is deleted afterwards.
+
+from scripts.synthetic_election import generate_election_definition, generate_voters
+from server.app import app
+from server.database import engine
+from server.models import (
+    Election,
+    Organization,
+    Voter,
+    db_session,
+    election_definition_hash,
+    election_definition_summary,
+    record_voter_activity,
+)
+from server.voter_file import reconcile_voters
+
+statement_count = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(*_args):
+    global statement_count  # pylint: disable=global-statement
+    statement_count += 1
+
+
+def create_election(organization_id: str, num_voters: int) -> str:
+    definition = generate_election_definition(num_precincts=10, num_ballot_styles=5)
+    election = Election(
+        id=str(uuid.uuid4()),
+        organization_id=organization_id,
+        definition=definition,
+        definition_hash=election_definition_hash(definition),
+        definition_summary=election_definition_summary(definition),
+    )
+    db_session.add(election)
+    db_session.commit()
+    reconcile_voters(
+        election.id,
+        (voter._asdict() for voter in generate_voters(num_voters, definition)),
+    )
+    # Give every voter some activity, so get_voter has activities to load and
+    # list_voters has summaries to serialize
+    for (voter_id,) in db_session.query(Voter.id).filter_by(election_id=election.id):
+        record_voter_activity(voter_id, "LoggedIn")
+        record_voter_activity(voter_id, "ConfirmedPrint")
+    db_session.commit()
+    return str(election.id)
+
+
+def count_statements(election_id: str) -> Dict[str, int]:
+    voter_id = (
+        db_session.query(Voter.id).filter_by(election_id=election_id).limit(1).scalar()
+    )
+    # Don't let objects loaded while setting up satisfy the endpoints' queries
+    db_session.remove()
+
+    global statement_count  # pylint: disable=global-statement
+    counts = {}
+    client = app.test_client()
+    for name, url in [
+        ("get_election", f"/api/elections/{election_id}"),
+        ("list_voters", f"/api/elections/{election_id}/voters"),
+        ("get_voter", f"/api/elections/{election_id}/voters/{voter_id}"),
+    ]:
+        statement_count = 0
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        counts[name] = statement_count
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(
+            "Usage: FLASK_ENV=development python -m scripts.check-voter-query-counts"
+            " <num_voters>"
+        )
+        sys.exit(1)
+
+    num_voters = int(sys.argv[1])
+    organization = Organization(id=str(uuid.uuid4()), name=f"Check {uuid.uuid4()}")
+    db_session.add(organization)
+    db_session.commit()
+    organization_id = str(organization.id)
+
+    try:
+        small_counts = count_statements(create_election(organization_id, num_voters))
+        large_counts = count_statements(
+            create_election(organization_id, num_voters * 10)
+        )
+        assert small_counts == large_counts, (small_counts, large_counts)
+        for name, count in small_counts.items():
+            print(
+                f"{name}: {count} statements for {num_voters} and {num_voters * 10} voters"
+            )
+    finally:
+        db_session.rollback()
+        Organization.query.filter_by(id=organization_id).delete()
+        db_session.commit()
@@ -0,0 +1,21 @@
+from typing import Sequence
+
+from server.ballot_email import send_executor
+from server.email_transport import BallotEmail, EmailTransport
+
+
+def send_ballot_emails(
+    emails: Sequence[BallotEmail], template: str, transport: EmailTransport
+):
+    # Send emails straight through a transport, in concurrent batches like the
+    # worker sends them, without queueing them in the database first. For
+    # exercising transports on their own.
+    transport.check_config()
+    batches = [
+        emails[start : start + transport.batch_size]
+        for start in range(0, len(emails), transport.batch_size)
+    ]
+    # Raises the first error, if any batch fails
+    list(
+        send_executor.map(lambda batch: transport.send_batch(batch, template), batches)
+    )
@@ -0,0 +1,63 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs
+
+# A stand-in for the Mailgun messages API, for exercising and benchmarking our
+# email sending without sending real emails. It records every message it's
+# sent, and can wait before responding to simulate Mailgun's latency.
+#
+# Point the server at it with MAILGUN_API_URL=http://localhost:<port>/v3.
+
+
+class FakeMailgun(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_seconds: float = 0):
+        super().__init__(("localhost", port), FakeMailgunHandler)
+        self.latency_seconds = latency_seconds
+        self.messages: List[Dict[str, Any]] = []
+        self.messages_lock = threading.Lock()
+
+    @property
+    def api_url(self) -> str:
+        return f"http://localhost:{self.server_address[1]}/v3"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class FakeMailgunHandler(BaseHTTPRequestHandler):
+    server: FakeMailgun
+    protocol_version = "HTTP/1.1"  # Allow keep-alive connections
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        form = parse_qs(body)
+        message = dict(
+            domain=self.path.split("/")[2],
+            to=form["to"],
+            text=form["text"][0],
+            recipient_variables=json.loads(form.get("recipient-variables", ["{}"])[0]),
+        )
+        time.sleep(self.server.latency_seconds)
+        with self.server.messages_lock:
+            self.server.messages.append(message)
+
+        response = json.dumps(dict(id="<fake>", message="Queued. Thank you.")).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+if __name__ == "__main__":
+    server = FakeMailgun(port=8025)
+    print(f"Fake Mailgun listening at {server.api_url}")
+    server.serve_forever()
@@ -0,0 +1,115 @@
+"""
+Generators for synthetic election definitions and matching voter files, used
+by the benchmark scripts.
+"""
+from typing import Any, Dict, Iterator, NamedTuple
+from xml.sax.saxutils import escape, quoteattr
+
+
+class SyntheticVoter(NamedTuple):
+    external_id: str
+    email: str
+    precinct: str
+    ballot_style: str
+
+
+def generate_election_definition(
+    num_precincts: int, num_ballot_styles: int
+) -> Dict[str, Any]:
+    # Each precinct uses exactly one ballot style, spread evenly across the
+    # ballot styles, and each ballot style has its own district and contest.
+    precinct_ids = [f"precinct-{i}" for i in range(num_precincts)]
+    return dict(
+        title="Synthetic Election",
+        state="State of Benchmark",
+        county=dict(id="county-1", name="Benchmark County"),
+        date="2021-11-02T00:00:00-08:00",
+        parties=[],
+        districts=[
+            dict(id=f"district-{i}", name=f"District {i}")
+            for i in range(num_ballot_styles)
+        ],
+        contests=[
+            dict(
+                id=f"contest-{i}",
+                districtId=f"district-{i}",
+                type="candidate",
+                section="Benchmark",
+                title=f"Contest {i}",
+                seats=1,
+                allowWriteIns=False,
+                candidates=[
+                    dict(id=f"candidate-{i}-a", name="Candidate A"),
+                    dict(id=f"candidate-{i}-b", name="Candidate B"),
+                ],
+            )
+            for i in range(num_ballot_styles)
+        ],
+        precincts=[
+            dict(id=precinct_id, name=f"Precinct {precinct_id}")
+            for precinct_id in precinct_ids
+        ],
+        ballotStyles=[
+            dict(
+                id=f"ballot-style-{i}",
+                precincts=precinct_ids[i::num_ballot_styles],
+                districts=[f"district-{i}"],
+            )
+            for i in range(num_ballot_styles)
+        ],
+    )
+
+
+def generate_voters(
+    num_voters: int, definition: Dict[str, Any]
+) -> Iterator[SyntheticVoter]:
+    # Cycle through the definition's (precinct, ballot style) pairs so every
+    # voter is valid for the election.
+    precinct_ballot_styles = [
+        (precinct_id, ballot_style["id"])
+        for ballot_style in definition["ballotStyles"]
+        for precinct_id in ballot_style["precincts"]
+    ]
+    for i in range(num_voters):
+        precinct, ballot_style = precinct_ballot_styles[i % len(precinct_ballot_styles)]
+        yield SyntheticVoter(
+            external_id=f"voter-{i}",
+            email=f"voter-{i}@example.com",
+            precinct=precinct,
+            ballot_style=ballot_style,
+        )
+
+
+def generate_csv_voter_file(voters: Iterator[SyntheticVoter]) -> bytes:
+    lines = ["Voter ID,Email,Ballot Style,Precinct"] + [
+        f"{voter.external_id},{voter.email},{voter.ballot_style},{voter.precinct}"
+        for voter in voters
+    ]
+    return "\n".join(lines).encode("utf-8")
+
+
+def generate_xml_voter_file(voters: Iterator[SyntheticVoter]) -> bytes:
+    # Mirrors the layout of the NIST voter records interchange format closely
+    # enough for parse_voter_xml, including elements it should skip over.
+    records = (
+        "<VoterDetails>"
+        "<Voter>"
+        f"<VoterIdentification Id={quoteattr(voter.external_id)}/>"
+        "<Contact>"
+        "<AddressLine type='street'>1 Main St</AddressLine>"
+        f"<AddressLine type='email'>{escape(voter.email)}</AddressLine>"
+        "</Contact>"
+        "</Voter>"
+        "<Ballot>"
+        f"<BallotFormIdentifier>{escape(voter.precinct)}</BallotFormIdentifier>"
+        f"<PollingPlace IdNumber={quoteattr(voter.ballot_style)}/>"
+        "</Ballot>"
+        "</VoterDetails>"
+        for voter in voters
+    )
+    return (
+        "<?xml version='1.0' encoding='utf-8'?>"
+        "<VoterRecordsResponse xmlns='http://itl.nist.gov/ns/voting/1500-100/v2'>"
+        + "".join(records)
+        + "</VoterRecordsResponse>"
+    ).encode("utf-8")
@@ -1,22 +1,30 @@
+import time
 import uuid
 import json
-import secrets
 from datetime import datetime
-from typing import List, Optional, cast
-from urllib.parse import urljoin
-import xml.etree.ElementTree as ET
-import requests
+from typing import Any, Dict, Optional, Tuple, cast
 from flask import Blueprint, request, jsonify
-from werkzeug.exceptions import BadRequest, Conflict
+from sqlalchemy import and_, case, exists, func, or_
+from sqlalchemy.orm import Query, load_only, selectinload
+from werkzeug.exceptions import BadRequest, Conflict, NotFound
 
-from .config import HTTP_ORIGIN, MAILGUN_API_KEY, MAILGUN_DOMAIN
 from .models import *
 from .auth import get_logged_in_admin
-from .csv_parse import (
-    CSVColumnType,
-    CSVValueType,
-    decode_csv_file,
-    parse_csv,
+from .ballot_email import queue_ballot_emails, send_due_ballot_emails
+from .config import RUN_BACKGROUND_TASKS_IMMEDIATELY
+from .export import (
+    EXPORT_BATCH_SIZE,
+    ExportColumn,
+    export_response,
+    parse_export_format,
+)
+from .responses import cached_json_response, json_response
+from .tasks import create_background_task, serialize_task
+from .voter_file import (
+    DEFAULT_MAX_VOTER_FILE_ERRORS,
+    check_voter_file,
+    process_voter_file,
+    save_voter_file,
 )
 
 
@@ -32,8 +40,26 @@ def create_election():
         id=str(uuid.uuid4()),
         organization_id=user.organization_id,
         definition=definition_json,
+        definition_hash=election_definition_hash(definition_json),
+        definition_summary=election_definition_summary(definition_json),
     )
     db_session.add(election)
+
+    # Precompute the trimmed definition we send to voters with each ballot style
+    for ballot_style in definition_json["ballotStyles"]:
+        ballot_style_definition = trim_election_definition(
+            definition_json, ballot_style["id"]
+        )
+        db_session.add(
+            BallotStyleDefinition(
+                id=str(uuid.uuid4()),
+                election_id=election.id,
+                ballot_style_id=ballot_style["id"],
+                definition=ballot_style_definition,
+                definition_hash=election_definition_hash(ballot_style_definition),
+            )
+        )
+
     db_session.commit()
     return jsonify(electionId=election.id)
 
@@ -41,46 +67,377 @@ def create_election():
 @api.route("/elections", methods=["GET"])
 def list_elections():
     user = get_logged_in_admin()
-    elections = (
-        Election.query.filter_by(organization_id=user.organization_id)
-        .order_by(Election.created_at)
-        .all()
-    )
-    return jsonify(
-        [dict(id=election.id, definition=election.definition) for election in elections]
+    query = Election.query.filter_by(organization_id=user.organization_id).order_by(
+        Election.created_at
     )
 
+    # With ?summary=true, we send a short summary of each election instead of
+    # its whole definition, which is all we need for a list of elections.
+    if request.args.get("summary") == "true":
+        elections = query.options(
+            load_only(Election.id, Election.definition_summary)
+        ).all()
+        voter_counts = dict(
+            db_session.query(Voter.election_id, func.count())
+            .filter(Voter.election_id.in_([election.id for election in elections]))
+            .group_by(Voter.election_id)
+        )
+        response = json_response(
+            [
+                dict(
+                    election.definition_summary,
+                    id=election.id,
+                    voterCount=voter_counts.get(election.id, 0),
+                )
+                for election in elections
+            ]
+        )
+    else:
+        elections = query.options(load_only(Election.id, Election.definition_hash))
+        response = json_response(
+            [
+                dict(id=election.id, definitionHash=election.definition_hash)
+                for election in elections
+            ]
+        )
+
+    # Let clients revalidate with If-None-Match so unchanged lists of
+    # elections get an empty 304 response.
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 
 @api.route("/elections/<election_id>", methods=["GET"])
 def get_election(election_id: str):
     election = get_or_404(Election, election_id)
-    voters = (
-        Voter.query.filter_by(election_id=election_id).order_by(Voter.external_id).all()
+    # Elections can have hundreds of thousands of voters, so we only send
+    # counts here. Voters are listed a page at a time by list_voters.
+    voter_count, emailed_voter_count = (
+        db_session.query(func.count(), func.count(Voter.ballot_email_last_sent_at))
+        .filter(Voter.election_id == election_id)
+        .one()
     )
-    return jsonify(
-        id=election.id,
-        definition=election.definition,
-        voters=[
-            dict(
-                id=voter.id,
-                externalId=voter.external_id,
-                email=voter.email,
-                precinct=voter.precinct,
-                ballotStyle=voter.ballot_style,
-                ballotEmailLastSentAt=isoformat(voter.ballot_email_last_sent_at),
-                wasManuallyAdded=voter.was_manually_added,
-                activities=[
-                    dict(
-                        activityName=activity.activity_name,
-                        timestamp=isoformat(activity.created_at),
-                        info=activity.info,
+    return json_response(
+        dict(
+            id=election.id,
+            definitionHash=election.definition_hash,
+            voterCount=voter_count,
+            emailedVoterCount=emailed_voter_count,
+        )
+    )
+
+
+# Stats are cached briefly per election (per server process), so dashboards
+# that poll them don't each rerun the aggregate queries.
+ELECTION_STATS_CACHE_SECONDS = 10
+election_stats_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+@api.route("/elections/<election_id>/stats", methods=["GET"])
+def get_election_stats(election_id: str):
+    get_or_404(Election, election_id)
+    now = time.monotonic()
+    cached = election_stats_cache.get(election_id)
+    if cached and now - cached[0] < ELECTION_STATS_CACHE_SECONDS:
+        stats = cached[1]
+    else:
+        stats = compute_election_stats(election_id)
+        # Drop expired entries so the cache doesn't grow with every election
+        for cached_election_id, (cached_at, _) in list(election_stats_cache.items()):
+            if now - cached_at >= ELECTION_STATS_CACHE_SECONDS:
+                del election_stats_cache[cached_election_id]
+        election_stats_cache[election_id] = (now, stats)
+
+    response = jsonify(stats)
+    response.cache_control.private = True
+    response.cache_control.max_age = ELECTION_STATS_CACHE_SECONDS
+    return response
+
+
+def compute_election_stats(election_id: str) -> Dict[str, Any]:
+    # All of these counts come from the voters' activity summaries, so we
+    # never need to read VoterActivity.
+    voter_counts = (
+        func.count(),
+        func.count(Voter.ballot_email_last_sent_at),
+        func.count(case((Voter.login_count > 0, 1))),
+        func.count(Voter.first_ballot_printed_at),
+    )
+
+    def serialize_counts(voters, emailed, logged_in, printed) -> Dict[str, int]:
+        return dict(voters=voters, emailed=emailed, loggedIn=logged_in, printed=printed)
+
+    def count_voters_by(column) -> Dict[str, Dict[str, int]]:
+        return {
+            value: serialize_counts(*counts)
+            for value, *counts in db_session.query(column, *voter_counts)
+            .filter(Voter.election_id == election_id)
+            .group_by(column)
+        }
+
+    totals = (
+        db_session.query(*voter_counts).filter(Voter.election_id == election_id).one()
+    )
+    return dict(
+        totals=serialize_counts(*totals),
+        byPrecinct=count_voters_by(Voter.precinct),
+        byBallotStyle=count_voters_by(Voter.ballot_style),
+        byLastActivity=dict(
+            db_session.query(Voter.last_activity_name, func.count())
+            .filter(
+                Voter.election_id == election_id, Voter.last_activity_name.isnot(None)
+            )
+            .group_by(Voter.last_activity_name)
+        ),
+    )
+
+
+DEFAULT_VOTERS_PAGE_SIZE = 100
+MAX_VOTERS_PAGE_SIZE = 1000
+VOTER_SORT_COLUMNS = {"externalId": Voter.external_id, "email": Voter.email}
+
+
+@api.route("/elections/<election_id>/voters", methods=["GET"])
+def list_voters(election_id: str):
+    get_or_404(Election, election_id)
+    limit = request.args.get("limit", DEFAULT_VOTERS_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_VOTERS_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_VOTERS_PAGE_SIZE}")
+
+    query = filter_voters(Voter.query.filter_by(election_id=election_id))
+
+    # Keyset pagination: each page starts after the last value of the sort
+    # column on the previous page, which is an index lookup no matter how deep
+    # the page is. Both sort columns are unique within an election. We fetch
+    # one extra voter to find out if there's another page.
+    sort = request.args.get("sort", "externalId")
+    if sort not in VOTER_SORT_COLUMNS:
+        raise BadRequest(f"sort must be one of: {', '.join(VOTER_SORT_COLUMNS)}")
+    sort_column = VOTER_SORT_COLUMNS[sort]
+    after = request.args.get("after")
+    if after is not None:
+        query = query.filter(sort_column > after)
+    voters = query.order_by(sort_column).limit(limit + 1).all()
+    has_next_page = len(voters) > limit
+    voters = voters[:limit]
+
+    return json_response(
+        dict(
+            voters=[serialize_voter(voter) for voter in voters],
+            nextCursor=(
+                getattr(voters[-1], sort_column.key) if has_next_page else None
+            ),
+        )
+    )
+
+
+def filter_voters(query: Query) -> Query:
+    # Each of these filters is backed by an index (see Voter.__table_args__)
+    args = request.args
+    if "precinct" in args:
+        query = query.filter(Voter.precinct == args["precinct"])
+    if "ballotStyle" in args:
+        query = query.filter(Voter.ballot_style == args["ballotStyle"])
+    if args.get("search"):
+        query = query.filter(
+            or_(
+                Voter.email.startswith(args["search"], autoescape=True),
+                Voter.external_id.startswith(args["search"], autoescape=True),
+            )
+        )
+    was_manually_added = bool_arg("wasManuallyAdded")
+    if was_manually_added is not None:
+        query = query.filter(Voter.was_manually_added.is_(was_manually_added))
+    email_sent = bool_arg("emailSent")
+    if email_sent is not None:
+        query = query.filter(
+            Voter.ballot_email_last_sent_at.isnot(None)
+            if email_sent
+            else Voter.ballot_email_last_sent_at.is_(None)
+        )
+    if "hasActivity" in args:
+        # Activities we track in the voter's activity summary can be checked
+        # without reading VoterActivity
+        activity_name = args["hasActivity"]
+        if activity_name in VOTER_ACTIVITY_SUMMARY_FILTERS:
+            query = query.filter(VOTER_ACTIVITY_SUMMARY_FILTERS[activity_name])
+        else:
+            query = query.filter(
+                exists().where(
+                    and_(
+                        VoterActivity.voter_id == Voter.id,
+                        VoterActivity.activity_name == activity_name,
                     )
-                    for activity in voter.activities
-                ],
+                )
+            )
+    return query
+
+
+VOTER_ACTIVITY_SUMMARY_FILTERS = {
+    "SentBallotUrl": Voter.ballot_email_last_sent_at.isnot(None),
+    "LoggedIn": Voter.login_count > 0,
+    "ConfirmedPrint": Voter.first_ballot_printed_at.isnot(None),
+}
+
+
+def bool_arg(name: str) -> Optional[bool]:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if value not in ("true", "false"):
+        raise BadRequest(f"{name} must be true or false")
+    return value == "true"
+
+
+@api.route("/elections/<election_id>/voters/<voter_id>", methods=["GET"])
+def get_voter(election_id: str, voter_id: str):
+    voter = (
+        Voter.query.filter_by(id=voter_id, election_id=election_id)
+        .options(selectinload(Voter.activities))
+        .one_or_none()
+    )
+    if voter is None:
+        raise NotFound(f"Voter {voter_id} not found")
+    return jsonify(
+        dict(
+            serialize_voter(voter),
+            activities=[
+                dict(
+                    activityName=activity.activity_name,
+                    timestamp=isoformat(activity.created_at),
+                    info=activity.info,
+                )
+                for activity in voter.activities
+            ],
+        )
+    )
+
+
+def serialize_voter(voter: Voter) -> dict:
+    return dict(
+        id=voter.id,
+        externalId=voter.external_id,
+        email=voter.email,
+        precinct=voter.precinct,
+        ballotStyle=voter.ballot_style,
+        ballotEmailLastSentAt=isoformat(voter.ballot_email_last_sent_at),
+        wasManuallyAdded=voter.was_manually_added,
+        lastActivityName=voter.last_activity_name,
+        lastActivityAt=isoformat(voter.last_activity_at),
+        loginCount=voter.login_count,
+        firstBallotPrintedAt=isoformat(voter.first_ballot_printed_at),
+    )
+
+
+VOTER_EXPORT_COLUMNS = [
+    ExportColumn("Voter ID", "externalId"),
+    ExportColumn("Email", "email"),
+    ExportColumn("Precinct", "precinct"),
+    ExportColumn("Ballot Style", "ballotStyle"),
+    ExportColumn("Manually Added", "wasManuallyAdded"),
+    ExportColumn("Ballot Email Last Sent At", "ballotEmailLastSentAt"),
+    ExportColumn("Last Activity", "lastActivityName"),
+    ExportColumn("Last Activity At", "lastActivityAt"),
+    ExportColumn("Login Count", "loginCount"),
+    ExportColumn("First Ballot Printed At", "firstBallotPrintedAt"),
+]
+
+
+@api.route("/elections/<election_id>/voters/export", methods=["GET"])
+def export_voters(election_id: str):
+    get_or_404(Election, election_id)
+    export_format = parse_export_format(request.args.get("format", "csv"))
+    voters = (
+        db_session.query(
+            Voter.external_id,
+            Voter.email,
+            Voter.precinct,
+            Voter.ballot_style,
+            Voter.was_manually_added,
+            Voter.ballot_email_last_sent_at,
+            Voter.last_activity_name,
+            Voter.last_activity_at,
+            Voter.login_count,
+            Voter.first_ballot_printed_at,
+        )
+        .filter(Voter.election_id == election_id)
+        .order_by(Voter.external_id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    return export_response(
+        voters, VOTER_EXPORT_COLUMNS, export_format, f"voters-{election_id}"
+    )
+
+
+VOTER_ACTIVITY_EXPORT_COLUMNS = [
+    ExportColumn("Voter ID", "externalId"),
+    ExportColumn("Email", "email"),
+    ExportColumn("Activity", "activityName"),
+    ExportColumn("Timestamp", "timestamp"),
+    ExportColumn("Info", "info"),
+]
+
+
+@api.route("/elections/<election_id>/activities/export", methods=["GET"])
+def export_voter_activities(election_id: str):
+    get_or_404(Election, election_id)
+    export_format = parse_export_format(request.args.get("format", "csv"))
+    activities = (
+        db_session.query(
+            Voter.external_id,
+            Voter.email,
+            VoterActivity.activity_name,
+            VoterActivity.created_at,
+            VoterActivity.info,
+        )
+        .select_from(VoterActivity)
+        .join(Voter, Voter.id == VoterActivity.voter_id)
+        .filter(Voter.election_id == election_id)
+        .order_by(VoterActivity.created_at, VoterActivity.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    return export_response(
+        activities,
+        VOTER_ACTIVITY_EXPORT_COLUMNS,
+        export_format,
+        f"voter-activity-{election_id}",
+    )
+
+
+@api.route("/definitions/<definition_hash>", methods=["GET"])
+def get_election_definition(definition_hash: str):
+    # Definitions are addressed by the hash of their contents, so the response
+    # for a given hash never changes and browsers (and any CDN in front of us)
+    # can cache it for good. Elections and voters just send the hash. The hash
+    # may be of a full election definition or a ballot style's trimmed one.
+
+    # We look the definition up the first time it's requested; after that,
+    # the serialized (and compressed) bytes are reused from memory.
+    def load_definition() -> bytes:
+        definition_source = (
+            (
+                Election.query.filter_by(definition_hash=definition_hash)
+                .options(load_only(Election.definition))
+                .first()
             )
-            for voter in voters
-        ],
+            or BallotStyleDefinition.query.filter_by(
+                definition_hash=definition_hash
+            ).first()
+        )
+        if definition_source is None:
+            raise NotFound(f"Election definition {definition_hash} not found")
+        return serialize_election_definition(definition_source.definition)
+
+    response = cached_json_response(definition_hash, load_definition)
+    # Each encoding of the definition is a different representation, so it
+    # needs its own ETag
+    content_encoding = response.headers.get("Content-Encoding")
+    response.set_etag(
+        f"{definition_hash}-{content_encoding}" if content_encoding else definition_hash
     )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
 
 @api.route("/elections/<election_id>", methods=["DELETE"])
@@ -91,113 +448,48 @@ def delete_election(election_id: str):
     return jsonify(status="ok")
 
 
-def duplicates(items: List):
-    seen = set()
-    dups = set()
-    for item in items:
-        if item in seen:
-            dups.add(item)
-        else:
-            seen.add(item)
-    return dups
-
-
 @api.route("/elections/<election_id>/voters/file", methods=["PUT"])
 def upload_voter_file(election_id: str):
-    election = get_or_404(Election, election_id)
+    get_or_404(Election, election_id)
     voter_file = request.files["voterFile"]
-
-    # Parse XML or CSV voter files
-    if "xml" in voter_file.mimetype:
-        voters = [
-            Voter(
-                id=str(uuid.uuid4()),
-                external_id=voter.find(".//{*}VoterIdentification").attrib["Id"],  # type: ignore
-                email=voter.find(".//{*}AddressLine[@type='email']").text,  # type: ignore
-                precinct=voter.find(".//{*}BallotFormIdentifier").text,  # type: ignore
-                ballot_style=voter.find(".//{*}PollingPlace").attrib["IdNumber"],  # type: ignore
-                election_id=election_id,
-            )
-            for voter in ET.parse(voter_file).getroot().findall(".//{*}VoterDetails")  # type: ignore
-        ]
-        duplicate_emails = duplicates([voter.email for voter in voters])
-        if len(duplicate_emails) > 0:
-            raise BadRequest(
-                "Each voter must have a unique email."
-                f" Found duplicates: {', '.join(duplicate_emails)}"
-            )
-
-    elif "csv" in voter_file.mimetype:
-        parsed_voters = parse_csv(
-            decode_csv_file(voter_file),
-            [
-                CSVColumnType(name="Voter ID", value_type=CSVValueType.TEXT),
-                CSVColumnType(name="Email", value_type=CSVValueType.EMAIL, unique=True),
-                CSVColumnType(name="Ballot Style", value_type=CSVValueType.TEXT),
-                CSVColumnType(name="Precinct", value_type=CSVValueType.TEXT),
-            ],
-        )
-        voters = [
-            Voter(
-                id=str(uuid.uuid4()),
-                external_id=voter["Voter ID"],
-                email=voter["Email"],
-                ballot_style=voter["Ballot Style"],
-                precinct=voter["Precinct"],
-                election_id=election_id,
-                was_manually_added=False,
-            )
-            for voter in parsed_voters
-        ]
-    else:
+    if not ("xml" in voter_file.mimetype or "csv" in voter_file.mimetype):
         raise BadRequest("Voter file must be in XML or CSV format")
 
-    # Validate voter data against election
-    for voter in voters:
-        if not any(
-            precinct["id"] == voter.precinct
-            for precinct in election.definition["precincts"]
-        ):
-            raise BadRequest(
-                f"Precinct {voter.precinct} is not in the election definition (voter {voter.email})"
-            )
-        ballot_style = next(
-            (
-                ballot_style
-                for ballot_style in election.definition["ballotStyles"]
-                if ballot_style["id"] == voter.ballot_style
+    # With validateOnly, we just check the file and report all of its errors
+    # (up to maxErrors) in the job result, without changing any voters.
+    validate_only = request.args.get("validateOnly") == "true"
+    max_errors = request.args.get("maxErrors", DEFAULT_MAX_VOTER_FILE_ERRORS, type=int)
+    if max_errors < 1:
+        raise BadRequest("maxErrors must be a positive number")
+
+    # Save the file and process it in the background, since large voter files
+    # can take longer to process than we want to keep a request open.
+    voter_file_record = save_voter_file(election_id, voter_file)
+    if validate_only:
+        task = create_background_task(
+            check_voter_file,
+            dict(
+                election_id=election_id,
+                voter_file_id=voter_file_record.id,
+                max_errors=max_errors,
             ),
-            None,
         )
-        if ballot_style is None:
-            raise BadRequest(
-                f"Ballot style {voter.ballot_style} is not in the election definition (voter {voter.email})"
-            )
-        if voter.precinct not in ballot_style["precincts"]:
-            raise BadRequest(
-                f"Precinct {voter.precinct} is not associated with ballot style {voter.ballot_style} in the election definition (voter {voter.email})"
-            )
-
-    # Add new voters
-    existing_voter_emails = {
-        email
-        for (email,) in Voter.query.filter_by(election_id=election_id).values(
-            Voter.email
+    else:
+        task = create_background_task(
+            process_voter_file,
+            dict(election_id=election_id, voter_file_id=voter_file_record.id),
         )
-    }
-    voters_to_add = [
-        voter for voter in voters if voter.email not in existing_voter_emails
-    ]
-    db_session.add_all(voters_to_add)
+    db_session.commit()
 
-    # Delete outdated voters
-    Voter.query.filter_by(election_id=election_id, was_manually_added=False).filter(
-        Voter.email.notin_([voter.email for voter in voters])
-    ).delete(synchronize_session=False)
+    return jsonify(status="ok", jobId=task.id)
 
-    db_session.commit()
 
-    return jsonify(status="ok")
+@api.route("/elections/<election_id>/voters/file/jobs/<job_id>", methods=["GET"])
+def get_voter_file_job(election_id: str, job_id: str):
+    task = get_or_404(BackgroundTask, job_id)
+    if task.payload.get("election_id") != election_id:
+        raise NotFound(f"Job {job_id} not found")
+    return jsonify(serialize_task(task))
 
 
 @api.route("/elections/<election_id>/voters", methods=["POST"])
@@ -237,43 +529,54 @@ def delete_voter(election_id: str, voter_id: str):  # pylint: disable=unused-arg
 
 @api.route("/elections/<election_id>/emails", methods=["POST"])
 def send_voter_ballot_emails(election_id: str):
+    get_or_404(Election, election_id)
     email_request = cast(dict, request.get_json())
-    voters = (
-        Voter.query.filter_by(election_id=election_id)
-        .filter(Voter.id.in_(email_request["voterIds"]))
-        .all()
-    )
-    assert len(voters) == len(email_request["voterIds"])
-    for voter in voters:
-        voter.ballot_url_token = secrets.token_hex(16)
-        send_ballot_email(
-            voter.email, email_request["template"], voter.ballot_url_token
-        )
-        voter.ballot_email_last_sent_at = datetime.now(timezone.utc)
-        record_voter_activity(voter.id, "SentBallotUrl")
 
-    db_session.commit()
+    # Clients send the same idempotency key when retrying a send, so voters
+    # who were already sent ballots by it don't get them (and new ballot URLs)
+    # again. The emails are sent by the worker (see server/ballot_email.py).
+    idempotency_key = email_request.get("idempotencyKey")
+    if idempotency_key is None:
+        idempotency_key = str(uuid.uuid4())
+    elif not isinstance(idempotency_key, str) or not 1 <= len(idempotency_key) <= 200:
+        raise BadRequest("idempotencyKey must be a string of at most 200 characters")
+
+    # If no voterIds are given, send to every voter in the election
+    voters = Voter.query.filter_by(election_id=election_id)
+    voter_ids = email_request.get("voterIds")
+    if voter_ids is not None:
+        if not isinstance(voter_ids, list) or not all(
+            isinstance(voter_id, str) for voter_id in voter_ids
+        ):
+            raise BadRequest("voterIds must be a list of voter ids")
+        voters = voters.filter(Voter.id.in_(voter_ids))
+        missing_voter_ids = set(voter_ids) - {
+            voter_id for (voter_id,) in voters.with_entities(Voter.id)
+        }
+        if missing_voter_ids:
+            raise NotFound(f"Voters not found: {', '.join(sorted(missing_voter_ids))}")
+
+    queued_count = queue_ballot_emails(
+        voters, email_request["template"], idempotency_key
+    )
 
-    return jsonify(status="ok")
+    # In tests, we don't run a worker, so we send the emails right away
+    if RUN_BACKGROUND_TASKS_IMMEDIATELY:
+        send_due_ballot_emails()
 
+    return jsonify(status="ok", queuedCount=queued_count)
 
-def send_ballot_email(voter_email: str, template: str, ballot_url_token: str):
-    ballot_url = urljoin(HTTP_ORIGIN, f"/voter/{ballot_url_token}")
 
-    print("SEND EMAIL", voter_email, template, ballot_url)
-    if not (MAILGUN_DOMAIN and MAILGUN_API_KEY):
-        raise Exception(
-            "Must configure MAILGUN_DOMAIN and MAILGUN_API_KEY to send emails"
-        )
-    return requests.post(
-        f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages",
-        auth=("api", MAILGUN_API_KEY),
-        data={
-            "from": "VotingWorks Support <rbm@vx.support>",
-            "to": [voter_email],
-            "subject": "Your Official Ballot",
-            "text": f"{template}\n{ballot_url}",
-        },
+@api.route("/elections/<election_id>/emails", methods=["GET"])
+def get_ballot_email_counts(election_id: str):
+    get_or_404(Election, election_id)
+    counts = dict(
+        db_session.query(BallotEmailMessage.status, func.count())
+        .filter(BallotEmailMessage.election_id == election_id)
+        .group_by(BallotEmailMessage.status)
+    )
+    return jsonify(
+        {status.value: counts.get(status.value, 0) for status in BallotEmailStatus}
     )
 
 
@@ -1,9 +1,10 @@
 from typing import Optional, cast
 from urllib.parse import urljoin, urlencode
-from flask import Blueprint, request, session, jsonify
+from flask import Blueprint, request, session
 from authlib.integrations.flask_client import OAuth, OAuthError
 from werkzeug.utils import redirect
 
+from .responses import json_response
 from .models import *
 from .config import (
     ADMIN_AUTH0_BASE_URL,
@@ -52,28 +53,40 @@ def auth_me():
     admin_user = get_logged_in_admin()
     voter = get_logged_in_voter()
 
-    return jsonify(
-        adminUser=(
-            admin_user
-            and dict(
-                email=admin_user.email,
-                organization=dict(
-                    id=admin_user.organization.id, name=admin_user.organization.name
-                ),
-            )
-        ),
-        voter=(
-            voter
-            and dict(
-                id=voter.id,
-                email=voter.email,
-                election=dict(
-                    id=voter.election_id, definition=voter.election.definition,
-                ),
-                ballotStyle=voter.ballot_style,
-                precinct=voter.precinct,
-            )
-        ),
+    # Voters only get the definition for their ballot style. (Manually added
+    # voters may have a ballot style that isn't in the definition, in which
+    # case we fall back to the full definition.)
+    voter_definition_hash = voter and (
+        db_session.query(BallotStyleDefinition.definition_hash)
+        .filter_by(election_id=voter.election_id, ballot_style_id=voter.ballot_style)
+        .scalar()
+        or voter.election.definition_hash
+    )
+
+    return json_response(
+        dict(
+            adminUser=(
+                admin_user
+                and dict(
+                    email=admin_user.email,
+                    organization=dict(
+                        id=admin_user.organization.id, name=admin_user.organization.name
+                    ),
+                )
+            ),
+            voter=(
+                voter
+                and dict(
+                    id=voter.id,
+                    email=voter.email,
+                    election=dict(
+                        id=voter.election_id, definitionHash=voter_definition_hash,
+                    ),
+                    ballotStyle=voter.ballot_style,
+                    precinct=voter.precinct,
+                )
+            ),
+        )
     )
 
 
@@ -0,0 +1,291 @@
+import time
+import uuid
+import secrets
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import DefaultDict, List, Optional, Set, Tuple
+from sqlalchemy import exists
+from sqlalchemy.orm import Query
+
+from .config import EMAIL_SEND_CONCURRENCY, EMAIL_SEND_RATE
+from .database import bulk_insert
+from .email_transport import BallotEmail, email_transport
+from .models import (
+    BallotEmailMessage,
+    BallotEmailStatus,
+    Voter,
+    db_session,
+    record_voters_activity,
+)
+
+# Sending ballots queues a BallotEmailMessage for each voter, and the worker
+# (see server/worker.py) sends the queued messages in batches, using the
+# configured email transport (see server/email_transport.py). Failed sends
+# are retried with exponential backoff, and each worker paces its sends to
+# EMAIL_SEND_RATE emails per second (see SendRateLimiter).
+#
+# Up to EMAIL_SEND_CONCURRENCY batches are sent at once, so we don't wait on
+# each batch in turn.
+#
+# Each send has an idempotency key. Retrying a send with the same key (e.g.
+# after it failed partway through queueing) only queues the voters it hasn't
+# already queued, and requeues any whose messages failed.
+
+MAX_SEND_ATTEMPTS = 5
+# Wait 30s before the first retry, then 1m, 2m, 4m
+RETRY_BASE_DELAY = timedelta(seconds=30)
+# Number of voters queued per transaction
+QUEUE_BATCH_SIZE = 1000
+
+# Only the transport's sends run on these threads. Database access stays on
+# the calling thread, since sessions can't be shared between threads.
+send_executor = ThreadPoolExecutor(
+    max_workers=EMAIL_SEND_CONCURRENCY, thread_name_prefix="send-email"
+)
+
+
+class SendRateLimiter:
+    """
+    A token bucket that paces sends to EMAIL_SEND_RATE emails per second.
+    Tokens build up at that rate, up to one second's worth (or one batch, if
+    that's more), and each email sent uses a token. Rather than sleeping until
+    it can send, the worker just doesn't claim more messages than it has
+    tokens for, so it can get on with other work (e.g. background tasks).
+    """
+
+    def __init__(self, rate: float, batch_size: int):
+        self.rate = rate
+        self.capacity = max(batch_size, int(rate))
+        # Wait for enough tokens to send a full batch, so we don't make lots
+        # of small sends while we're being rate limited
+        self.min_send = min(batch_size, self.capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def available(self) -> int:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        return int(self.tokens) if self.tokens >= self.min_send else 0
+
+    def use(self, count: int):
+        self.tokens -= count
+
+    def wait(self):
+        # Sleep until we can send (for when there's nothing else to do)
+        while self.available() == 0:
+            time.sleep((self.min_send - self.tokens) / self.rate)
+
+
+send_rate_limiter = SendRateLimiter(EMAIL_SEND_RATE, email_transport.batch_size)
+
+
+def queue_ballot_emails(voters: Query, template: str, idempotency_key: str) -> int:
+    """
+    Queue ballot emails for the voters matched by the given query, each with a
+    new ballot URL token. Voters are queued in batches, each committed as we
+    go, so if queueing fails partway, retrying with the same idempotency key
+    picks up where it left off. Voters who already have a message with
+    this key are skipped, unless sending it failed, in which case it's queued
+    again. Returns the number of messages queued.
+    """
+    email_transport.check_config()
+    now = datetime.now(timezone.utc)
+
+    requeued_count = BallotEmailMessage.query.filter(
+        BallotEmailMessage.idempotency_key == idempotency_key,
+        BallotEmailMessage.status == BallotEmailStatus.FAILED.value,
+        BallotEmailMessage.voter_id.in_(voters.with_entities(Voter.id).statement),
+    ).update(
+        dict(
+            status=BallotEmailStatus.QUEUED.value,
+            attempts=0,
+            next_attempt_at=now,
+            error=None,
+        ),
+        synchronize_session=False,
+    )
+    db_session.commit()
+
+    already_queued = (
+        exists()
+        .where(BallotEmailMessage.voter_id == Voter.id)
+        .where(BallotEmailMessage.idempotency_key == idempotency_key)
+    )
+    voter_ids = [
+        voter_id
+        for (voter_id,) in voters.filter(~already_queued)
+        .with_entities(Voter.id)
+        .order_by(Voter.id)
+    ]
+    for start in range(0, len(voter_ids), QUEUE_BATCH_SIZE):
+        batch = (
+            db_session.query(Voter.id, Voter.election_id)
+            .filter(Voter.id.in_(voter_ids[start : start + QUEUE_BATCH_SIZE]))
+            .all()
+        )
+        # Each send gives the voter a new ballot URL. The new token is stored
+        # on the message and only replaces the voter's token once the message
+        # is sent (see send_next_ballot_emails), so the voter's current link
+        # keeps working until then, and a message that never gets sent
+        # doesn't leave the voter with a link they never received.
+        bulk_insert(
+            BallotEmailMessage.__table__,  # pylint: disable=no-member
+            (
+                dict(
+                    id=str(uuid.uuid4()),
+                    election_id=election_id,
+                    voter_id=voter_id,
+                    idempotency_key=idempotency_key,
+                    template=template,
+                    ballot_url_token=secrets.token_hex(16),
+                    status=BallotEmailStatus.QUEUED.value,
+                    attempts=0,
+                    next_attempt_at=now,
+                )
+                for voter_id, election_id in batch
+            ),
+        )
+        db_session.commit()
+
+    return requeued_count + len(voter_ids)
+
+
+def send_next_ballot_emails() -> int:
+    """
+    Send the next batches of queued ballot emails that are due (up to
+    EMAIL_SEND_CONCURRENCY batches, sent at once), as many as
+    send_rate_limiter allows right now. Returns the number of messages we
+    tried to send (zero if none were due or we're being rate limited).
+    """
+    limit = min(
+        email_transport.batch_size * EMAIL_SEND_CONCURRENCY,
+        send_rate_limiter.available(),
+    )
+    if limit == 0:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    # Lock the messages we're sending, skipping any that another worker has
+    # already locked, until we've recorded the results
+    messages = (
+        db_session.query(BallotEmailMessage, Voter)
+        .join(Voter, BallotEmailMessage.voter_id == Voter.id)
+        .filter(
+            BallotEmailMessage.status == BallotEmailStatus.QUEUED.value,
+            BallotEmailMessage.next_attempt_at <= now,
+        )
+        .order_by(BallotEmailMessage.next_attempt_at)
+        .limit(limit)
+        .with_for_update(of=BallotEmailMessage, skip_locked=True)
+        .all()
+    )
+    send_rate_limiter.use(len(messages))
+    batches = batch_messages(messages, email_transport.batch_size)
+
+    def try_send_batch(emails: List[BallotEmail], template: str) -> Optional[str]:
+        try:
+            email_transport.send_batch(emails, template)
+            return None
+        except Exception as error:  # pylint: disable=broad-except
+            return "".join(traceback.format_exception_only(type(error), error)).strip()
+
+    # Read the emails and tokens here, before handing the batches to other
+    # threads
+    errors = send_executor.map(
+        try_send_batch,
+        [
+            [
+                BallotEmail(voter.email, message.ballot_url_token)
+                for message, voter in batch
+            ]
+            for _, batch in batches
+        ],
+        [template for template, _ in batches],
+    )
+
+    for (_, batch), error in zip(batches, errors):
+        if error is not None:
+            for message, _ in batch:
+                record_failed_send(message, error, now)
+        else:
+            sent_at = datetime.now(timezone.utc)
+            for message, voter in batch:
+                message.status = BallotEmailStatus.SENT.value
+                message.attempts += 1
+                message.sent_at = sent_at
+                message.error = None
+                # The voter's link is now the one we just sent. If a voter had
+                # several messages sent, the last one sent has the link that
+                # works.
+                voter.ballot_url_token = message.ballot_url_token
+                voter.ballot_email_last_sent_at = sent_at
+            record_voters_activity(
+                [voter.id for _, voter in batch], "SentBallotUrl", sent_at
+            )
+    db_session.commit()
+
+    return len(messages)
+
+
+def batch_messages(
+    messages: List[Tuple[BallotEmailMessage, Voter]], batch_size: int
+) -> List[Tuple[str, List[Tuple[BallotEmailMessage, Voter]]]]:
+    """
+    Split messages into batches of up to batch_size messages with the same
+    template. Messages queued together have the same template, so there's
+    usually just one template to batch by.
+
+    Transports may key a batch's emails by address (e.g. Mailgun's recipient
+    variables), so a batch never has the same address twice. A voter in two
+    elections can have two messages due at once, so those go in separate
+    batches.
+    """
+    batches: List[Tuple[str, List[Tuple[BallotEmailMessage, Voter]]]] = []
+    # Template -> open batches with that template, along with their addresses
+    open_batches: DefaultDict[
+        str, List[Tuple[Set[str], List[Tuple[BallotEmailMessage, Voter]]]]
+    ] = defaultdict(list)
+    for message, voter in messages:
+        address = voter.email.lower()
+        template_batches = open_batches[message.template]
+        index = next(
+            (
+                index
+                for index, (addresses, _) in enumerate(template_batches)
+                if address not in addresses
+            ),
+            None,
+        )
+        if index is None:
+            index = len(template_batches)
+            template_batches.append((set(), []))
+            batches.append((message.template, template_batches[index][1]))
+        addresses, batch = template_batches[index]
+        addresses.add(address)
+        batch.append((message, voter))
+        if len(batch) == batch_size:
+            del template_batches[index]
+    return batches
+
+
+def record_failed_send(message: BallotEmailMessage, error: str, now: datetime):
+    message.attempts += 1
+    message.error = error
+    if message.attempts >= MAX_SEND_ATTEMPTS:
+        message.status = BallotEmailStatus.FAILED.value
+    else:
+        retry_delay = RETRY_BASE_DELAY * 2 ** (message.attempts - 1)
+        message.next_attempt_at = now + retry_delay
+
+
+def send_due_ballot_emails():
+    # Send every email that's due, waiting on the rate limit as needed
+    while True:
+        send_rate_limiter.wait()
+        if send_next_ballot_emails() == 0:
+            return
@@ -116,8 +116,44 @@ def read_admin_auth0_creds() -> Tuple[str, str, str]:
     ADMIN_AUTH0_CLIENT_SECRET,
 ) = read_admin_auth0_creds()
 
+EMAIL_TRANSPORTS = ("mailgun", "smtp", "maildir", "memory")
+
+
+def read_email_transport() -> str:
+    # See server/email_transport.py
+    email_transport = os.environ.get("EMAIL_TRANSPORT", "mailgun")
+    if email_transport not in EMAIL_TRANSPORTS:
+        raise Exception(
+            f"EMAIL_TRANSPORT must be one of: {', '.join(EMAIL_TRANSPORTS)}"
+        )
+    return email_transport
+
+
+EMAIL_TRANSPORT = read_email_transport()
+
 MAILGUN_DOMAIN = os.environ.get("MAILGUN_DOMAIN", "")
 MAILGUN_API_KEY = os.environ.get("MAILGUN_API_KEY", "")
+# Can be pointed at a fake Mailgun server (see scripts/fake_mailgun.py)
+MAILGUN_API_URL = os.environ.get("MAILGUN_API_URL", "https://api.mailgun.net/v3")
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() not in (
+    "0",
+    "no",
+    "false",
+)
+
+EMAIL_MAILDIR_PATH = os.environ.get("EMAIL_MAILDIR_PATH", "maildir")
+# Simulated latency per batch for the in-memory email transport
+EMAIL_SINK_LATENCY_MS = int(os.environ.get("EMAIL_SINK_LATENCY_MS", "0"))
+
+# Max ballot emails per second each worker sends, to stay under Mailgun's limits
+EMAIL_SEND_RATE = float(os.environ.get("EMAIL_SEND_RATE", "100"))
+# Max batches of emails each worker sends at once
+EMAIL_SEND_CONCURRENCY = int(os.environ.get("EMAIL_SEND_CONCURRENCY", "4"))
 
 SENTRY_DSN = os.environ.get("SENTRY_DSN")
 
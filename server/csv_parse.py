@@ -1,17 +1,45 @@
 # pylint: disable=stop-iteration-return
 from collections import defaultdict
 from enum import Enum
-from typing import List, Iterator, Dict, Any, NamedTuple, Tuple
+from typing import (
+    IO,
+    List,
+    Iterator,
+    Dict,
+    Any,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Callable,
+)
 import csv as py_csv
-import io, re, locale, chardet
+import io, re, locale, codecs, itertools, chardet
 from werkzeug.exceptions import BadRequest
 from werkzeug.datastructures import FileStorage
 
 locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
 
 
+class CSVErrorType(str, Enum):
+    INVALID_FILE = "invalidFile"
+    INVALID_ROW = "invalidRow"
+    INVALID_NUMBER = "invalidNumber"
+    INVALID_EMAIL = "invalidEmail"
+    INVALID_YES_NO = "invalidYesNo"
+    DUPLICATE = "duplicate"
+    TOTAL_ROW = "totalRow"
+
+
 class CSVParseError(BadRequest):
-    pass
+    def __init__(
+        self, description: str, error_type: CSVErrorType = CSVErrorType.INVALID_FILE
+    ):
+        super().__init__(description)
+        self.error_type = error_type
+
+
+def raise_error(error: CSVParseError):
+    raise error
 
 
 class CSVValueType(str, Enum):
@@ -38,26 +66,32 @@ CSVDictIterator = Iterator[Dict[str, Any]]
 # Robust CSV parsing
 # "Be conservative in what you do, be liberal in what you accept from others"
 # https://en.wikipedia.org/wiki/Robustness_principle
-def parse_csv(csv_string: str, columns: List[CSVColumnType]) -> CSVDictIterator:
-    validate_is_csv(csv_string)
+def parse_csv(
+    csv_lines: Iterator[str],
+    columns: List[CSVColumnType],
+    on_error: Callable[[CSVParseError], None] = raise_error,
+) -> CSVDictIterator:
+    return (row for _, row in parse_csv_with_row_numbers(csv_lines, columns, on_error))
+
+
+def parse_csv_with_row_numbers(
+    csv_lines: Iterator[str],
+    columns: List[CSVColumnType],
+    on_error: Callable[[CSVParseError], None] = raise_error,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Like parse_csv, but yields each row's number in the file (counting the
+    header row as row 1) along with the row, so callers that check the rows
+    further can say which row has a problem.
+    """
+    # We only need the first line to check that this looks like a CSV, so we
+    # can stream the rest of the lines through the parser.
+    first_line = next(csv_lines, "")
+    validate_is_csv(first_line)
     csv: CSVIterator = py_csv.reader(
-        io.StringIO(csv_string, newline=None), delimiter=","
+        itertools.chain([first_line], csv_lines), delimiter=","
     )
-    csv = strip_whitespace(csv)
-    csv = reject_no_rows(csv)
-    csv = skip_empty_trailing_columns(csv)
-    csv = validate_and_normalize_headers(csv, columns)
-    dict_csv = convert_rows_to_dicts(csv)
-    dict_csv = reject_empty_cells(dict_csv)
-    dict_csv = reject_total_rows(dict_csv)
-    dict_csv = validate_and_parse_values(dict_csv, columns)
-    dict_csv = reject_duplicate_values(dict_csv, columns)
-    # Filter out empty rows towards the end so we can get accurate row numbers
-    # in all the other checkers
-    dict_csv = skip_empty_rows(dict_csv)
-    dict_csv = reject_final_total_row(dict_csv, columns)
-
-    return dict_csv
+    return parse_rows(csv, columns, on_error)
 
 
 def validate_is_csv(csv: str):
@@ -81,21 +115,22 @@ def validate_is_csv(csv: str):
     )
 
 
-def strip_whitespace(csv: CSVIterator) -> CSVIterator:
-    return ([cell.strip() for cell in row] for row in csv)
-
-
-def reject_no_rows(csv: CSVIterator) -> CSVIterator:
-    yield next(csv)
-    second = next(csv, None)
-    if second is None:
-        raise CSVParseError("CSV must contain at least one row after headers.")
-    yield second
-    yield from csv
-
+def parse_rows(
+    csv: CSVIterator,
+    columns: List[CSVColumnType],
+    on_error: Callable[[CSVParseError], None] = raise_error,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Validate and parse the rows of a CSV in a single pass. The header row is
+    used to compile the column schema into positional checks, which are then
+    run on each row in turn, so each row is only walked a few times and only
+    turned into a dict once it's valid.
 
-def skip_empty_trailing_columns(csv: CSVIterator) -> CSVIterator:
-    headers = next(csv)
+    Errors in the headers always raise. Errors in a row are passed to on_error,
+    which raises by default. If on_error returns instead, the row is skipped
+    and parsing continues, so all of a file's errors can be found in one pass.
+    """
+    headers = [cell.strip() for cell in next(csv)]
 
     # Count empty trailing columns so we can ignore them.
     empty_trailing_header_count = 0
@@ -104,32 +139,120 @@ def skip_empty_trailing_columns(csv: CSVIterator) -> CSVIterator:
             empty_trailing_header_count += 1
         else:
             break
+    header_count = len(headers) - empty_trailing_header_count
+
+    headers = validate_and_normalize_headers(headers[0:header_count], columns)
+    parse_values = compile_value_parser(headers, columns)
+
+    # For our purposes, we want all the columns with unique=True to be used as
+    # one composite unique key for the rows.
+    unique_columns = tuple(sorted(column.name for column in columns if column.unique))
+    unique_indexes = [headers.index(column) for column in unique_columns]
+    seen = set()
+
+    # Collect the values of number columns so we can check for a total row at
+    # the end.
+    number_indexes = [
+        index
+        for index, header in enumerate(headers)
+        if any(
+            column.name == header and column.value_type is CSVValueType.NUMBER
+            for column in columns
+        )
+    ]
+    number_values = defaultdict(list)
+
+    has_rows = False
+    for r, row in enumerate(csv):  # pylint: disable=invalid-name
+        has_rows = True
+        row = [cell.strip() for cell in row]
+
+        try:
+            if empty_trailing_header_count > 0:
+                for (empty_trailing_column_index, cell) in enumerate(
+                    row[-empty_trailing_header_count:]
+                ):
+                    if len(cell) > 0:
+                        raise CSVParseError(
+                            f"Empty trailing column {header_count + empty_trailing_column_index + 1}"
+                            f" expected to have no values, but row {r+2} has a value: {cell}.",
+                            CSVErrorType.INVALID_ROW,
+                        )
+                # Keep only cells for non-empty columns.
+                row = row[0:-empty_trailing_header_count]
+
+            if len(row) == 0:
+                row = ["" for _ in headers]
+            if len(row) != len(headers):
+                raise CSVParseError(
+                    f"Wrong number of cells in row {r+2}."
+                    f" Expected {len(headers)} {pluralize('cell', len(headers))},"
+                    f" got {len(row)} {pluralize('cell', len(row))}.",
+                    CSVErrorType.INVALID_ROW,
+                )
+
+            # Skip empty rows. We still count them above so that row numbers in
+            # error messages match the file.
+            if not any(row):
+                continue
 
-    if empty_trailing_header_count == 0:
-        # No empty trailing columns, just send the data through as-is.
-        yield headers
-        yield from csv
-    else:
-        yield headers[0:-empty_trailing_header_count]
-        for r, row in enumerate(csv):  # pylint: disable=invalid-name
-            for (empty_trailing_column_index, cell) in enumerate(
-                row[-empty_trailing_header_count:]
-            ):
-                if len(cell) > 0:
+            if "" in row:
+                raise CSVParseError(
+                    "All cells must have values."
+                    f" Got empty cell at column {headers[row.index('')]}, row {r+2}.",
+                    CSVErrorType.INVALID_ROW,
+                )
+
+            # Since the total pattern only matches letters between non-letter
+            # boundaries, searching all the cells joined with a newline finds the
+            # same totals as searching each cell. Checking for the word first lets
+            # us skip the (much slower) regex search for almost every row.
+            row_text = "\n".join(row)
+            if "total" in row_text.lower() and TOTAL_REGEX.search(row_text):
+                raise CSVParseError(
+                    f"It looks like you might have a total row (row {r+2})."
+                    " Please remove this row from the CSV.",
+                    CSVErrorType.TOTAL_ROW,
+                )
+
+            values = parse_values(row, r)
+
+            if unique_indexes:
+                row_key = tuple(values[index] for index in unique_indexes)
+                if row_key in seen:
                     raise CSVParseError(
-                        f"Empty trailing column {len(headers) - empty_trailing_header_count + empty_trailing_column_index + 1}"
-                        f" expected to have no values, but row {r+2} has a value: {cell}."
+                        f"Each row must be uniquely identified by {format_tuple(unique_columns)}."
+                        + f" Found duplicate: {format_tuple(row_key)}.",
+                        CSVErrorType.DUPLICATE,
                     )
+                seen.add(row_key)
+        except CSVParseError as error:
+            on_error(error)
+            continue
 
-            # Pass only cells for non-empty columns.
-            yield row[0:-empty_trailing_header_count]
+        for index in number_indexes:
+            number_values[index].append(values[index])
 
+        yield r + 2, dict(zip(headers, values))
 
-def validate_and_normalize_headers(
-    csv: CSVIterator, columns: List[CSVColumnType]
-) -> CSVIterator:
-    headers = next(csv)
+    if not has_rows:
+        raise CSVParseError("CSV must contain at least one row after headers.")
+
+    for values in number_values.values():
+        if sum(values[:-1]) == values[-1]:
+            on_error(
+                CSVParseError(
+                    "It looks like the last row in the CSV might be a total row."
+                    " Please remove this row from the CSV.",
+                    CSVErrorType.TOTAL_ROW,
+                )
+            )
+            break
 
+
+def validate_and_normalize_headers(
+    headers: CSVRow, columns: List[CSVColumnType]
+) -> CSVRow:
     normalized_headers = [
         next((c.name for c in columns if c.name.lower() == header.lower()), header)
         for header in headers
@@ -154,167 +277,90 @@ def validate_and_normalize_headers(
             f"Found unexpected columns. Allowed columns: {', '.join(sorted(allowed_headers))}."
         )
 
-    yield normalized_headers
-    yield from csv
-
-
-def is_empty_row(row: Dict[str, Any]) -> bool:
-    return all(value == "" for value in row.values())
+    return normalized_headers
 
 
-def skip_empty_rows(csv: CSVDictIterator) -> CSVDictIterator:
-    for row in csv:
-        if not is_empty_row(row):
-            yield row
-
+def parse_number(value: str, where: str) -> Any:
+    try:
+        return locale.atoi(value)
+    except ValueError:
+        # pylint: disable=raise-missing-from
+        raise CSVParseError(
+            f"Expected a number in {where}. Got: {value}.", CSVErrorType.INVALID_NUMBER
+        )
 
-def reject_empty_cells(csv: CSVDictIterator) -> CSVDictIterator:
-    for r, row in enumerate(csv):  # pylint: disable=invalid-name
-        # Skip empty rows, we filter them out later
-        if is_empty_row(row):
-            yield row
-            continue
 
-        for header, value in row.items():  # pylint: disable=invalid-name
-            if value == "":
-                raise CSVParseError(
-                    "All cells must have values."
-                    f" Got empty cell at column {header}, row {r+2}."
-                )
-        yield row
+def parse_email(value: str, where: str) -> Any:
+    if not EMAIL_REGEX.match(value):
+        raise CSVParseError(
+            f"Expected an email address in {where}. Got: {value}.",
+            CSVErrorType.INVALID_EMAIL,
+        )
+    return value
 
 
-def validate_and_parse_values(
-    csv: CSVDictIterator, columns: List[CSVColumnType]
-) -> CSVDictIterator:
-    columns_by_header = {column.name: column for column in columns}
-
-    def parse_and_validate_value(header, value, r):  # pylint: disable=invalid-name
-        where = f"column {header}, row {r+2}"
-        column = columns_by_header[header]
+def parse_yes_no(value: str, where: str) -> Any:
+    if value.lower() in ["y", "yes"]:
+        return True
+    if value.lower() in ["n", "no"]:
+        return False
+    raise CSVParseError(
+        f"Expected Y or N in {where}. Got: {value}.", CSVErrorType.INVALID_YES_NO
+    )
 
-        if column.value_type is CSVValueType.NUMBER:
-            try:
-                return locale.atoi(value)
-            except ValueError:
-                # pylint: disable=raise-missing-from
-                raise CSVParseError(f"Expected a number in {where}. Got: {value}.")
 
-        if column.value_type is CSVValueType.EMAIL:
-            if not EMAIL_REGEX.match(value):
-                raise CSVParseError(
-                    f"Expected an email address in {where}. Got: {value}."
-                )
+VALUE_PARSERS: Dict[CSVValueType, Callable[[str, str], Any]] = {
+    CSVValueType.NUMBER: parse_number,
+    CSVValueType.EMAIL: parse_email,
+    CSVValueType.YES_NO: parse_yes_no,
+}
 
-        if column.value_type is CSVValueType.YES_NO:
-            if value.lower() in ["y", "yes"]:
-                return True
-            if value.lower() in ["n", "no"]:
-                return False
-            raise CSVParseError(f"Expected Y or N in {where}. Got: {value}.")
 
-        return value
+def compile_value_parser(
+    headers: CSVRow, columns: List[CSVColumnType]
+) -> Callable[[CSVRow, int], List[Any]]:
+    # Look up the parser for each column once, by position, so parsing a row
+    # only has to touch the cells that aren't plain text.
+    columns_by_header = {column.name: column for column in columns}
+    value_parsers = [
+        (index, header, VALUE_PARSERS[columns_by_header[header].value_type])
+        for index, header in enumerate(headers)
+        if columns_by_header[header].value_type in VALUE_PARSERS
+    ]
 
-    for r, row in enumerate(csv):  # pylint: disable=invalid-name
-        # Skip empty rows, we filter them out later
-        if is_empty_row(row):
-            yield row
-            continue
+    def parse_values(row: CSVRow, r: int) -> List[Any]:  # pylint: disable=invalid-name
+        values: List[Any] = list(row)
+        for index, header, parse_value in value_parsers:
+            values[index] = parse_value(row[index], f"column {header}, row {r+2}")
+        return values
 
-        yield {
-            header: parse_and_validate_value(header, value, r)
-            for header, value in row.items()
-        }
+    return parse_values
 
 
 def format_tuple(tup: Tuple) -> str:
     return str(tup[0]) if len(tup) == 1 else str(tup)
 
 
-def reject_duplicate_values(
-    csv: CSVDictIterator, columns: List[CSVColumnType]
-) -> CSVDictIterator:
-    # For our purposes, we want all the columns with unique=True to be used as
-    # one composite unique key for the rows.
-    unique_columns = tuple(sorted(column.name for column in columns if column.unique))
-    if len(unique_columns) == 0:
-        yield from csv
-        return
-
-    seen = set()
-    for row in csv:
-        # Skip empty rows, we filter them out later
-        if is_empty_row(row):
-            yield row
-            continue
-
-        row_key = tuple(row[column] for column in unique_columns)
-        if row_key in seen:
-            raise CSVParseError(
-                f"Each row must be uniquely identified by {format_tuple(unique_columns)}."
-                + f" Found duplicate: {format_tuple(row_key)}."
-            )
-        else:
-            seen.add(row_key)
-
-        yield row
-
-
 TOTAL_REGEX = re.compile(r"(^|[^a-zA-Z])(sub)?totals?($|[^a-zA-Z])", re.IGNORECASE)
 
 
-def reject_total_rows(csv: CSVDictIterator) -> CSVDictIterator:
-    for r, row in enumerate(csv):  # pylint: disable=invalid-name
-        for value in row.values():
-            if TOTAL_REGEX.search(value):
-                raise CSVParseError(
-                    f"It looks like you might have a total row (row {r+2})."
-                    " Please remove this row from the CSV."
-                )
-        yield row
-
-
-def reject_final_total_row(csv: CSVDictIterator, columns: List[CSVColumnType]):
-    column_values = defaultdict(list)
-
-    for row in csv:
-        for column in columns:
-            value = row.get(column.name)
-            if column.value_type == CSVValueType.NUMBER and value is not None:
-                column_values[column.name].append(value)
-        yield row
-
-    for values in column_values.values():
-        if sum(values[:-1]) == values[-1]:
-            raise CSVParseError(
-                "It looks like the last row in the CSV might be a total row."
-                " Please remove this row from the CSV."
-            )
-
-
-def convert_rows_to_dicts(csv: CSVIterator) -> CSVDictIterator:
-    headers = next(csv)
-
-    for r, row in enumerate(csv):  # pylint: disable=invalid-name
-        # Normalize empty rows to make sure we can turn them into dicts.
-        # We'll filter them out later.
-        if len(row) == 0:
-            row = ["" for _ in headers]
-        if len(row) != len(headers):
-            raise CSVParseError(
-                f"Wrong number of cells in row {r+2}."
-                f" Expected {len(headers)} {pluralize('cell', len(headers))},"
-                f" got {len(row)} {pluralize('cell', len(row))}."
-            )
-
-        yield dict(zip(headers, row))
-
-
 def pluralize(word: str, num: int) -> str:
     return word if num == 1 else f"{word}s"
 
 
-def decode_csv_file(file: FileStorage) -> str:
+# Read and decode uploaded files in chunks of this size so we never need to
+# hold the whole file in memory.
+DECODE_CHUNK_SIZE = 1024 * 1024
+# Number of bytes to look at when guessing the encoding of non-UTF-8 files.
+ENCODING_SAMPLE_SIZE = 64 * 1024
+NON_ASCII_LINE_REGEX = re.compile(rb"[^\n]*[\x80-\xff][^\n]*\n?")
+
+
+def decode_csv_file(file: FileStorage) -> Iterator[str]:
+    """
+    Returns an iterator over the decoded lines of a CSV file, for parse_csv.
+    The file is decoded incrementally as lines are read.
+    """
     user_error = BadRequest(
         "Please submit a valid CSV."
         " If you are working with an Excel spreadsheet,"
@@ -325,13 +371,74 @@ def decode_csv_file(file: FileStorage) -> str:
         raise user_error
 
     try:
-        file_bytes = file.stream.read()
-        return str(file_bytes.decode("utf-8-sig"))
-    except UnicodeDecodeError as err:
+        encoding = detect_encoding(file.stream)
+    except Exception as err:
+        raise user_error from err
+    if not encoding:
+        raise user_error
+
+    def decode_lines_or_raise_user_error():
         try:
-            detect_result = chardet.detect(file_bytes)
-            if not detect_result["encoding"]:
-                raise user_error from err
-            return str(file_bytes.decode(detect_result["encoding"]))
-        except Exception:
+            yield from decode_lines(file.stream, encoding)
+        except (UnicodeDecodeError, LookupError) as err:
             raise user_error from err
+
+    return decode_lines_or_raise_user_error()
+
+
+def detect_encoding(stream: IO[bytes]) -> Optional[str]:
+    # Most files are UTF-8, so first check if the whole file decodes as UTF-8.
+    # We decode in chunks and throw away the output, so this is fast and uses a
+    # constant amount of memory.
+    stream.seek(0)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending, chunk = b"", b""
+    try:
+        while True:
+            # Bytes left over from the last chunk (e.g. half of a character)
+            pending, _ = decoder.getstate()
+            chunk = stream.read(DECODE_CHUNK_SIZE)
+            decoder.decode(chunk, final=len(chunk) == 0)
+            if len(chunk) == 0:
+                return "utf-8-sig"
+    except UnicodeDecodeError as error:
+        # Otherwise, guess the encoding from the lines with non-ASCII bytes,
+        # starting with the line where decoding failed. Most of a voter file
+        # is usually plain ASCII, which doesn't tell encodings apart.
+        data = pending + chunk
+        # error.start is an offset into the bytes the decoder tried to decode,
+        # which leave out the BOM (if the file starts with one), so adjust it
+        # to be an offset into data
+        error_start = error.start + len(data) - len(error.object)
+        line_start = data.rfind(b"\n", 0, error_start) + 1
+        sample = b"".join(NON_ASCII_LINE_REGEX.findall(data, line_start))
+        encoding: Optional[str] = chardet.detect(sample[:ENCODING_SAMPLE_SIZE])[
+            "encoding"
+        ]
+        # The file has non-ASCII bytes, so it can't be ASCII. Most likely it
+        # came from Excel on Windows.
+        if encoding == "ascii":
+            return "windows-1252"
+        return encoding
+    finally:
+        stream.seek(0)
+
+
+def decode_lines(stream: IO[bytes], encoding: str) -> Iterator[str]:
+    # Translate \r\n and \r line endings to \n, like opening a file in text
+    # mode does, handling line endings split across chunks.
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(encoding)(), translate=True
+    )
+    partial_line = ""
+    while True:
+        chunk = stream.read(DECODE_CHUNK_SIZE)
+        text = partial_line + decoder.decode(chunk, final=len(chunk) == 0)
+        lines = text.split("\n")
+        partial_line = lines.pop()
+        for line in lines:
+            yield line + "\n"
+        if len(chunk) == 0:
+            break
+    if partial_line:
+        yield partial_line
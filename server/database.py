@@ -1,5 +1,8 @@
 import re
-from sqlalchemy import create_engine, MetaData
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable
+from sqlalchemy import create_engine, MetaData, Table
 from sqlalchemy.orm import scoped_session, sessionmaker, Query
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 from .config import DATABASE_URL
@@ -31,6 +34,64 @@ class Base:
         return re.sub(r"(?<!^)(?=[A-Z])", "_", cls.__name__).lower()
 
 
+def bulk_insert(
+    table: Table, rows: Iterable[Dict[str, Any]], batch_size: int = 10000
+) -> int:
+    """
+    Insert rows in batches using PostgreSQL's COPY, which is much faster than
+    db_session.add_all (or even a multi-row INSERT) for large numbers of rows,
+    and only holds one batch of rows in memory at a time. Runs in the current
+    session's transaction.
+
+    COPY bypasses SQLAlchemy, so we fill in any Python-side column defaults
+    (e.g. created_at) for columns the rows don't include.
+    """
+    # pylint: disable=no-member
+    cursor = db_session.connection().connection.cursor()
+    preparer = engine.dialect.identifier_preparer
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if len(batch) == 0:
+            return count
+
+        defaults = {
+            column.name: column.default
+            for column in table.columns
+            if column.default is not None and column.name not in batch[0]
+        }
+        columns = list(batch[0].keys()) + list(defaults.keys())
+
+        buffer = io.StringIO()
+        for row in batch:
+            values = [row.get(column) for column in batch[0].keys()] + [
+                default.arg if default.is_scalar else default.arg(None)
+                for default in defaults.values()
+            ]
+            buffer.write(",".join(map(format_copy_value, values)) + "\n")
+        buffer.seek(0)
+
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)}"
+            f" ({', '.join(preparer.quote(column) for column in columns)})"
+            " FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        count += len(batch)
+
+
+def format_copy_value(value: Any) -> str:
+    # In CSV format, COPY only reads the unquoted NULL marker (\N, see
+    # bulk_insert) as NULL, so we write None as the bare marker and quote every
+    # other non-numeric value, which keeps None, "" and "\N" distinct.
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bool, int, float)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
 def init_db(engine=engine):
     # pylint: disable=wildcard-import,import-outside-toplevel,unused-import
     import server.models
@@ -0,0 +1,182 @@
+import abc
+import json
+import time
+import smtplib
+import mailbox
+import threading
+from email.message import EmailMessage
+from typing import List, NamedTuple, Sequence, Tuple
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    EMAIL_MAILDIR_PATH,
+    EMAIL_SEND_CONCURRENCY,
+    EMAIL_SINK_LATENCY_MS,
+    EMAIL_TRANSPORT,
+    HTTP_ORIGIN,
+    MAILGUN_API_KEY,
+    MAILGUN_API_URL,
+    MAILGUN_DOMAIN,
+    SMTP_HOST,
+    SMTP_PASSWORD,
+    SMTP_PORT,
+    SMTP_USERNAME,
+    SMTP_USE_TLS,
+)
+
+# Email transports deliver batches of ballot emails (all with the same
+# template). Which one we use is chosen by the EMAIL_TRANSPORT env var:
+# - mailgun: the Mailgun API (what we use in production)
+# - smtp: any SMTP server
+# - maildir: writes emails to a local maildir, for development
+# - memory: keeps emails in memory, optionally waiting EMAIL_SINK_LATENCY_MS
+#   per batch, for load testing the send path without sending anything
+#
+# Batches may be sent from several threads at once (see server/ballot_email.py),
+# so transports must be thread-safe.
+
+MAILGUN_BATCH_SIZE = 1000
+# (connect, read) timeouts in seconds for Mailgun API calls, so a stalled
+# connection fails the batch (to be retried) instead of hanging the worker
+MAILGUN_TIMEOUT = (10, 60)
+
+FROM_ADDRESS = "VotingWorks Support <rbm@vx.support>"
+SUBJECT = "Your Official Ballot"
+
+
+class BallotEmail(NamedTuple):
+    voter_email: str
+    ballot_url_token: str
+
+
+def ballot_url(ballot_url_token: str) -> str:
+    return urljoin(HTTP_ORIGIN, f"/voter/{ballot_url_token}")
+
+
+def ballot_email_text(template: str, url: str) -> str:
+    return f"{template}\n{url}"
+
+
+class EmailTransport(abc.ABC):
+    batch_size = 1000
+
+    def check_config(self):
+        """Raise an exception if the transport isn't configured to send."""
+
+    @abc.abstractmethod
+    def send_batch(self, emails: Sequence[BallotEmail], template: str):
+        """Send a batch of at most batch_size emails, raising if it fails."""
+
+
+class MailgunTransport(EmailTransport):
+    # Mailgun's batch sending: one API call sends the same message to up to
+    # 1,000 recipients, and each recipient's ballot URL is filled in from the
+    # recipient variables. Calls go through one session, so keep-alive
+    # connections to Mailgun are reused.
+    # See https://documentation.mailgun.com/en/latest/user_manual.html#batch-sending
+    batch_size = MAILGUN_BATCH_SIZE
+
+    def __init__(self):
+        self.session = requests.Session()
+        for scheme in ["https://", "http://"]:
+            self.session.mount(scheme, HTTPAdapter(pool_maxsize=EMAIL_SEND_CONCURRENCY))
+
+    def check_config(self):
+        if not (MAILGUN_DOMAIN and MAILGUN_API_KEY):
+            raise Exception(
+                "Must configure MAILGUN_DOMAIN and MAILGUN_API_KEY to send emails"
+            )
+
+    def send_batch(self, emails: Sequence[BallotEmail], template: str):
+        # Since we pass recipient variables, Mailgun sends each recipient their
+        # own copy of the message (they don't see each other in the To header).
+        recipient_variables = {
+            email.voter_email: dict(ballot_url=ballot_url(email.ballot_url_token))
+            for email in emails
+        }
+        response = self.session.post(
+            f"{MAILGUN_API_URL}/{MAILGUN_DOMAIN}/messages",
+            auth=("api", MAILGUN_API_KEY),
+            data={
+                "from": FROM_ADDRESS,
+                "to": [email.voter_email for email in emails],
+                "subject": SUBJECT,
+                "text": ballot_email_text(template, "%recipient.ballot_url%"),
+                "recipient-variables": json.dumps(recipient_variables),
+            },
+            timeout=MAILGUN_TIMEOUT,
+        )
+        response.raise_for_status()
+
+
+def build_email_message(email: BallotEmail, template: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = FROM_ADDRESS
+    message["To"] = email.voter_email
+    message["Subject"] = SUBJECT
+    message.set_content(ballot_email_text(template, ballot_url(email.ballot_url_token)))
+    return message
+
+
+class SmtpTransport(EmailTransport):
+    # SMTP sends each recipient their own message, so batches just share a
+    # connection
+    batch_size = 100
+
+    def check_config(self):
+        if not SMTP_HOST:
+            raise Exception("Must configure SMTP_HOST to send emails over SMTP")
+
+    def send_batch(self, emails: Sequence[BallotEmail], template: str):
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
+            if SMTP_USE_TLS:
+                smtp.starttls()
+            if SMTP_USERNAME:
+                smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+            for email in emails:
+                smtp.send_message(build_email_message(email, template))
+
+
+class MaildirTransport(EmailTransport):
+    def __init__(self, path: str = EMAIL_MAILDIR_PATH):
+        self.maildir = mailbox.Maildir(path, create=True)
+        # Maildir generates unique file names with a counter that isn't
+        # thread-safe, so we add messages one thread at a time
+        self.maildir_lock = threading.Lock()
+
+    def send_batch(self, emails: Sequence[BallotEmail], template: str):
+        messages = [build_email_message(email, template) for email in emails]
+        with self.maildir_lock:
+            for message in messages:
+                self.maildir.add(message)
+
+
+class MemoryTransport(EmailTransport):
+    def __init__(self, latency_seconds: float = EMAIL_SINK_LATENCY_MS / 1000):
+        self.latency_seconds = latency_seconds
+        # (voter email, email text)
+        self.sent_emails: List[Tuple[str, str]] = []
+        self.sent_emails_lock = threading.Lock()
+
+    def send_batch(self, emails: Sequence[BallotEmail], template: str):
+        time.sleep(self.latency_seconds)
+        with self.sent_emails_lock:
+            self.sent_emails.extend(
+                (
+                    email.voter_email,
+                    ballot_email_text(template, ballot_url(email.ballot_url_token)),
+                )
+                for email in emails
+            )
+
+
+EMAIL_TRANSPORTS = {
+    "mailgun": MailgunTransport,
+    "smtp": SmtpTransport,
+    "maildir": MaildirTransport,
+    "memory": MemoryTransport,
+}
+
+email_transport: EmailTransport = EMAIL_TRANSPORTS[EMAIL_TRANSPORT]()
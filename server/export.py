@@ -0,0 +1,107 @@
+import io
+import csv
+import json
+from enum import Enum
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, NamedTuple, Sequence
+from flask import Response, stream_with_context
+from werkzeug.exceptions import BadRequest
+
+# Streaming exports of large tables (e.g. all of an election's voters). Rows
+# should come from a query using yield_per, which reads them from the
+# database with a server-side cursor, and are written out in batches as they
+# arrive, so memory use stays flat no matter how many rows there are.
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+EXPORT_MIMETYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+class ExportColumn(NamedTuple):
+    csv_header: str
+    json_key: str
+
+
+def parse_export_format(value: str) -> ExportFormat:
+    try:
+        return ExportFormat(value)
+    except ValueError:
+        # pylint: disable=raise-missing-from
+        raise BadRequest(
+            f"format must be one of: {', '.join(f.value for f in ExportFormat)}"
+        )
+
+
+def csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def serialize_rows(
+    rows: Iterable[Sequence[Any]],
+    columns: List[ExportColumn],
+    export_format: ExportFormat,
+) -> Iterator[str]:
+    buffer = io.StringIO()
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    if export_format is ExportFormat.CSV:
+        writer = csv.writer(buffer)
+        writer.writerow([column.csv_header for column in columns])
+        # Send the header right away, before we've read any rows
+        yield flush()
+
+    json_keys = [column.json_key for column in columns]
+    for row_number, row in enumerate(rows, start=1):
+        if export_format is ExportFormat.CSV:
+            writer.writerow([csv_value(value) for value in row])
+        else:
+            buffer.write(
+                json.dumps(
+                    {key: json_value(value) for key, value in zip(json_keys, row)}
+                )
+                + "\n"
+            )
+        if row_number == 1 or row_number % EXPORT_BATCH_SIZE == 0:
+            yield flush()
+
+    yield flush()
+
+
+def export_response(
+    rows: Iterable[Sequence[Any]],
+    columns: List[ExportColumn],
+    export_format: ExportFormat,
+    filename: str,
+) -> Response:
+    # stream_with_context keeps the request (and its database session) open
+    # until we've sent the last row.
+    content_disposition = f'attachment; filename="{filename}.{export_format.value}"'
+    return Response(
+        stream_with_context(serialize_rows(rows, columns, export_format)),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={"Content-Disposition": content_disposition},
+    )
@@ -0,0 +1,77 @@
+# pylint: disable=invalid-name
+"""Voter activity summary
+
+Revision ID: 0f984f390036
+Revises: 7be34738044c
+Create Date: 2026-10-17 18:31:27.904416+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0f984f390036"
+down_revision = "7be34738044c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "voter", sa.Column("last_activity_name", sa.String(length=200), nullable=True),
+    )
+    op.add_column("voter", sa.Column("last_activity_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "voter",
+        sa.Column("login_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.alter_column("voter", "login_count", server_default=None)
+    op.add_column(
+        "voter", sa.Column("first_ballot_printed_at", sa.DateTime(), nullable=True)
+    )
+
+    # Backfill from existing activities
+    op.execute(
+        """
+        UPDATE voter
+        SET last_activity_name = last_activity.activity_name,
+            last_activity_at = last_activity.created_at
+        FROM (
+            SELECT DISTINCT ON (voter_id) voter_id, activity_name, created_at
+            FROM voter_activity
+            ORDER BY voter_id, created_at DESC
+        ) AS last_activity
+        WHERE voter.id = last_activity.voter_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE voter
+        SET login_count = logins.count
+        FROM (
+            SELECT voter_id, count(*) AS count
+            FROM voter_activity
+            WHERE activity_name = 'LoggedIn'
+            GROUP BY voter_id
+        ) AS logins
+        WHERE voter.id = logins.voter_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE voter
+        SET first_ballot_printed_at = prints.first_printed_at
+        FROM (
+            SELECT voter_id, min(created_at) AS first_printed_at
+            FROM voter_activity
+            WHERE activity_name = 'ConfirmedPrint'
+            GROUP BY voter_id
+        ) AS prints
+        WHERE voter.id = prints.voter_id
+        """
+    )
+
+
+def downgrade():
+    pass
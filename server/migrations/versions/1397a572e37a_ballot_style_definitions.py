@@ -0,0 +1,104 @@
+# pylint: disable=invalid-name
+"""Ballot style definitions
+
+Revision ID: 1397a572e37a
+Revises: 43f5a3f43be2
+Create Date: 2026-10-17 17:46:03.215874+00:00
+
+"""
+import json
+import uuid
+import hashlib
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "1397a572e37a"
+down_revision = "43f5a3f43be2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    ballot_style_definition = op.create_table(
+        "ballot_style_definition",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.String(length=200), nullable=False),
+        sa.Column("election_id", sa.String(length=200), nullable=False),
+        sa.Column("ballot_style_id", sa.String(length=200), nullable=False),
+        sa.Column("definition", sa.JSON(), nullable=False),
+        sa.Column("definition_hash", sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["election_id"],
+            ["election.id"],
+            name=op.f("ballot_style_definition_election_id_fkey"),
+            ondelete="cascade",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("ballot_style_definition_pkey")),
+        sa.UniqueConstraint(
+            "election_id",
+            "ballot_style_id",
+            name=op.f("ballot_style_definition_election_id_ballot_style_id_key"),
+        ),
+    )
+    op.create_index(
+        op.f("ballot_style_definition_definition_hash_idx"),
+        "ballot_style_definition",
+        ["definition_hash"],
+        unique=False,
+    )
+
+    # Backfill existing elections. This matches trim_election_definition and
+    # election_definition_hash at the time of this migration.
+    election = sa.table(
+        "election", sa.column("id", sa.String), sa.column("definition", sa.JSON),
+    )
+    connection = op.get_bind()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for election_id, definition in connection.execute(
+        sa.select(election.c.id, election.c.definition)
+    ):
+        for ballot_style in definition["ballotStyles"]:
+            precinct_ids = set(ballot_style["precincts"])
+            district_ids = set(ballot_style["districts"])
+            trimmed_definition = dict(
+                definition,
+                ballotStyles=[ballot_style],
+                precincts=[
+                    precinct
+                    for precinct in definition["precincts"]
+                    if precinct["id"] in precinct_ids
+                ],
+                districts=[
+                    district
+                    for district in definition["districts"]
+                    if district["id"] in district_ids
+                ],
+                contests=[
+                    contest
+                    for contest in definition["contests"]
+                    if contest["districtId"] in district_ids
+                    and contest.get("partyId") == ballot_style.get("partyId")
+                ],
+            )
+            serialized_definition = json.dumps(
+                trimmed_definition, sort_keys=True, separators=(",", ":")
+            ).encode("utf-8")
+            connection.execute(
+                ballot_style_definition.insert().values(
+                    id=str(uuid.uuid4()),
+                    created_at=now,
+                    updated_at=now,
+                    election_id=election_id,
+                    ballot_style_id=ballot_style["id"],
+                    definition=trimmed_definition,
+                    definition_hash=hashlib.sha256(serialized_definition).hexdigest(),
+                )
+            )
+
+
+def downgrade():
+    pass
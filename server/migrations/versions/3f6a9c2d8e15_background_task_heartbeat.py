@@ -0,0 +1,41 @@
+# pylint: disable=invalid-name
+"""Background task heartbeat
+
+Revision ID: 3f6a9c2d8e15
+Revises: b7d4e1a92c60
+Create Date: 2026-10-17 23:31:12.402657+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f6a9c2d8e15"
+down_revision = "b7d4e1a92c60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "background_task", sa.Column("heartbeat_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "background_task",
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.alter_column("background_task", "attempts", server_default=None)
+    # Tasks that were already running count as one attempt, so if their worker
+    # has since died, they'll be run again.
+    op.execute(
+        """
+        UPDATE background_task
+        SET heartbeat_at = started_at, attempts = 1
+        WHERE started_at IS NOT NULL
+        """
+    )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,58 @@
+# pylint: disable=invalid-name
+"""Election definition hash
+
+Revision ID: 43f5a3f43be2
+Revises: aa8f30335d17
+Create Date: 2026-10-17 17:24:40.117052+00:00
+
+"""
+import json
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "43f5a3f43be2"
+down_revision = "aa8f30335d17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "election", sa.Column("definition_hash", sa.String(length=64), nullable=True),
+    )
+
+    # Backfill existing elections. This matches election_definition_hash at
+    # the time of this migration.
+    election = sa.table(
+        "election",
+        sa.column("id", sa.String),
+        sa.column("definition", sa.JSON),
+        sa.column("definition_hash", sa.String),
+    )
+    connection = op.get_bind()
+    for election_id, definition in connection.execute(
+        sa.select(election.c.id, election.c.definition)
+    ):
+        serialized_definition = json.dumps(
+            definition, sort_keys=True, separators=(",", ":")
+        ).encode("utf-8")
+        connection.execute(
+            election.update()
+            .where(election.c.id == election_id)
+            .values(definition_hash=hashlib.sha256(serialized_definition).hexdigest())
+        )
+
+    op.alter_column("election", "definition_hash", nullable=False)
+    op.create_index(
+        op.f("election_definition_hash_idx"),
+        "election",
+        ["definition_hash"],
+        unique=False,
+    )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,63 @@
+# pylint: disable=invalid-name
+"""Ballot email message
+
+Revision ID: 5c1d8e2f7a94
+Revises: 0f984f390036
+Create Date: 2026-10-17 20:12:45.318207+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5c1d8e2f7a94"
+down_revision = "0f984f390036"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ballot_email_message",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.String(length=200), nullable=False),
+        sa.Column("election_id", sa.String(length=200), nullable=False),
+        sa.Column("voter_id", sa.String(length=200), nullable=False),
+        sa.Column("template", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["election_id"],
+            ["election.id"],
+            name=op.f("ballot_email_message_election_id_fkey"),
+            ondelete="cascade",
+        ),
+        sa.ForeignKeyConstraint(
+            ["voter_id"],
+            ["voter.id"],
+            name=op.f("ballot_email_message_voter_id_fkey"),
+            ondelete="cascade",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("ballot_email_message_pkey")),
+    )
+    op.create_index(
+        "ballot_email_message_status_next_attempt_at_idx",
+        "ballot_email_message",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ballot_email_message_election_id_status_idx",
+        "ballot_email_message",
+        ["election_id", "status"],
+        unique=False,
+    )
+
+
+def downgrade():
+    pass
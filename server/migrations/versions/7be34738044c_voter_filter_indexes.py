@@ -0,0 +1,61 @@
+# pylint: disable=invalid-name
+"""Voter filter indexes
+
+Revision ID: 7be34738044c
+Revises: 1397a572e37a
+Create Date: 2026-10-17 18:05:52.640193+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "7be34738044c"
+down_revision = "1397a572e37a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "voter_election_id_precinct_idx",
+        "voter",
+        ["election_id", "precinct"],
+        unique=False,
+    )
+    op.create_index(
+        "voter_election_id_ballot_style_idx",
+        "voter",
+        ["election_id", "ballot_style"],
+        unique=False,
+    )
+    op.create_index(
+        "voter_election_id_was_manually_added_idx",
+        "voter",
+        ["election_id", "was_manually_added"],
+        unique=False,
+    )
+    op.create_index(
+        "voter_election_id_email_pattern_idx",
+        "voter",
+        ["election_id", "email"],
+        unique=False,
+        postgresql_ops={"email": "varchar_pattern_ops"},
+    )
+    op.create_index(
+        "voter_election_id_external_id_pattern_idx",
+        "voter",
+        ["election_id", "external_id"],
+        unique=False,
+        postgresql_ops={"external_id": "varchar_pattern_ops"},
+    )
+    op.create_index(
+        "voter_activity_voter_id_activity_name_idx",
+        "voter_activity",
+        ["voter_id", "activity_name"],
+        unique=False,
+    )
+
+
+def downgrade():
+    pass
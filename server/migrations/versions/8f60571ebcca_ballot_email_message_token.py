@@ -0,0 +1,39 @@
+# pylint: disable=invalid-name
+"""Ballot email message token
+
+Revision ID: 8f60571ebcca
+Revises: 3f6a9c2d8e15
+Create Date: 2026-10-18 00:12:47.118302+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8f60571ebcca"
+down_revision = "3f6a9c2d8e15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "ballot_email_message",
+        sa.Column("ballot_url_token", sa.String(length=200), nullable=True),
+    )
+    # Messages that haven't been sent yet were going to use the voter's
+    # current token, so they keep it.
+    op.execute(
+        """
+        UPDATE ballot_email_message
+        SET ballot_url_token = voter.ballot_url_token
+        FROM voter
+        WHERE ballot_email_message.voter_id = voter.id
+        AND ballot_email_message.status != 'sent'
+        """
+    )
+
+
+def downgrade():
+    pass
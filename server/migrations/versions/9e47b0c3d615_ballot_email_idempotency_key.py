@@ -0,0 +1,36 @@
+# pylint: disable=invalid-name
+"""Ballot email idempotency key
+
+Revision ID: 9e47b0c3d615
+Revises: 5c1d8e2f7a94
+Create Date: 2026-10-17 21:40:03.552871+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9e47b0c3d615"
+down_revision = "5c1d8e2f7a94"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "ballot_email_message",
+        sa.Column("idempotency_key", sa.String(length=200), nullable=True),
+    )
+    # Existing messages each get their own key, so none of them are skipped
+    op.execute("UPDATE ballot_email_message SET idempotency_key = id")
+    op.alter_column("ballot_email_message", "idempotency_key", nullable=False)
+    op.create_unique_constraint(
+        op.f("ballot_email_message_idempotency_key_voter_id_key"),
+        "ballot_email_message",
+        ["idempotency_key", "voter_id"],
+    )
+
+
+def downgrade():
+    pass
@@ -0,0 +1,54 @@
+# pylint: disable=invalid-name
+"""Election definition summary
+
+Revision ID: aa8f30335d17
+Revises: e8999afa4fbd
+Create Date: 2026-10-17 17:02:11.482930+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "aa8f30335d17"
+down_revision = "e8999afa4fbd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("election", sa.Column("definition_summary", sa.JSON(), nullable=True))
+
+    # Backfill existing elections. This matches election_definition_summary
+    # at the time of this migration.
+    election = sa.table(
+        "election",
+        sa.column("id", sa.String),
+        sa.column("definition", sa.JSON),
+        sa.column("definition_summary", sa.JSON),
+    )
+    connection = op.get_bind()
+    for election_id, definition in connection.execute(
+        sa.select(election.c.id, election.c.definition)
+    ):
+        connection.execute(
+            election.update()
+            .where(election.c.id == election_id)
+            .values(
+                definition_summary=dict(
+                    title=definition["title"],
+                    date=definition["date"],
+                    county=definition["county"],
+                    precinctCount=len(definition["precincts"]),
+                    ballotStyleCount=len(definition["ballotStyles"]),
+                    contestCount=len(definition["contests"]),
+                )
+            )
+        )
+
+    op.alter_column("election", "definition_summary", nullable=False)
+
+
+def downgrade():
+    pass
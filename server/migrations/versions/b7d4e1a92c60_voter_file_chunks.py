@@ -0,0 +1,66 @@
+# pylint: disable=invalid-name
+"""Voter file chunks
+
+Revision ID: b7d4e1a92c60
+Revises: 9e47b0c3d615
+Create Date: 2026-10-17 23:05:41.118302+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7d4e1a92c60"
+down_revision = "9e47b0c3d615"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "voter_file_chunk",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("voter_file_id", sa.String(length=200), nullable=False),
+        sa.Column("start_byte", sa.Integer(), nullable=False),
+        sa.Column("contents", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["voter_file_id"],
+            ["voter_file.id"],
+            name=op.f("voter_file_chunk_voter_file_id_fkey"),
+            ondelete="cascade",
+        ),
+        sa.PrimaryKeyConstraint(
+            "voter_file_id", "start_byte", name=op.f("voter_file_chunk_pkey")
+        ),
+    )
+    # Voter files are only kept until they're processed, so we only need to
+    # move the files of tasks that haven't finished yet, each as one chunk.
+    op.execute(
+        """
+        INSERT INTO voter_file_chunk
+            (created_at, updated_at, voter_file_id, start_byte, contents)
+        SELECT created_at, updated_at, id, 0, contents
+        FROM voter_file
+        WHERE EXISTS (
+            SELECT 1 FROM background_task
+            WHERE background_task.payload->>'voter_file_id' = voter_file.id
+            AND background_task.completed_at IS NULL
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM voter_file
+        WHERE NOT EXISTS (
+            SELECT 1 FROM voter_file_chunk
+            WHERE voter_file_chunk.voter_file_id = voter_file.id
+        )
+        """
+    )
+    op.drop_column("voter_file", "contents")
+
+
+def downgrade():
+    pass
@@ -0,0 +1,55 @@
+# pylint: disable=invalid-name
+"""Background tasks
+
+Revision ID: e8999afa4fbd
+Revises: ea3557cdf0ef
+Create Date: 2026-10-17 16:16:36.605274+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e8999afa4fbd"
+down_revision = "ea3557cdf0ef"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "background_task",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.String(length=200), nullable=False),
+        sa.Column("task_name", sa.String(length=200), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.Column("rows_processed", sa.Integer(), nullable=False),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name=op.f("background_task_pkey")),
+    )
+    op.create_table(
+        "voter_file",
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.String(length=200), nullable=False),
+        sa.Column("election_id", sa.String(length=200), nullable=False),
+        sa.Column("name", sa.String(length=250), nullable=False),
+        sa.Column("mimetype", sa.String(length=200), nullable=False),
+        sa.Column("contents", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["election_id"],
+            ["election.id"],
+            name=op.f("voter_file_election_id_fkey"),
+            ondelete="cascade",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("voter_file_pkey")),
+    )
+
+
+def downgrade():
+    pass
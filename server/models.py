@@ -1,6 +1,9 @@
-from typing import Any, Dict, Type
+from typing import Any, Dict, List, Optional, Type
 from datetime import datetime as dt, timezone
+import json
 import uuid
+import hashlib
+from enum import Enum
 from werkzeug.exceptions import NotFound
 
 from sqlalchemy import (
@@ -8,13 +11,24 @@ from sqlalchemy import (
     String,
     Column,
     ForeignKey,
+    Index,
     JSON,
     Boolean,
+    Integer,
+    LargeBinary,
+    Text,
     UniqueConstraint,
+    case,
+    func,
+    or_,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import TypeDecorator
-from .database import Base, db_session  # pylint: disable=cyclic-import,unused-import
+from .database import (  # pylint: disable=cyclic-import,unused-import
+    Base,
+    bulk_insert,
+    db_session,
+)
 
 
 def get_or_404(model: Type[Base], primary_key: str):
@@ -77,6 +91,85 @@ class Election(BaseModel):
     )
 
     definition = Column(JSON)
+    # Hash of the definition (see election_definition_hash), which clients use
+    # to fetch and cache the definition separately from the election.
+    definition_hash = Column(String(64), nullable=False, index=True)
+    # The parts of the definition we show in lists of elections, computed when
+    # the election is created (see election_definition_summary), so listing
+    # elections doesn't need to load each definition.
+    definition_summary = Column(JSON, nullable=False)
+
+
+def serialize_election_definition(definition: Dict[str, Any]) -> bytes:
+    # Serialize canonically, so the same definition always has the same hash
+    return json.dumps(definition, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def election_definition_hash(definition: Dict[str, Any]) -> str:
+    return hashlib.sha256(serialize_election_definition(definition)).hexdigest()
+
+
+def trim_election_definition(
+    definition: Dict[str, Any], ballot_style_id: str
+) -> Dict[str, Any]:
+    """
+    Trim an election definition down to one ballot style: its precincts, its
+    districts and the contests on it (matching how the ballot picks contests
+    for a ballot style, by district and party). Everything else is kept.
+    """
+    ballot_style = next(
+        ballot_style
+        for ballot_style in definition["ballotStyles"]
+        if ballot_style["id"] == ballot_style_id
+    )
+    precinct_ids = set(ballot_style["precincts"])
+    district_ids = set(ballot_style["districts"])
+    return dict(
+        definition,
+        ballotStyles=[ballot_style],
+        precincts=[
+            precinct
+            for precinct in definition["precincts"]
+            if precinct["id"] in precinct_ids
+        ],
+        districts=[
+            district
+            for district in definition["districts"]
+            if district["id"] in district_ids
+        ],
+        contests=[
+            contest
+            for contest in definition["contests"]
+            if contest["districtId"] in district_ids
+            and contest.get("partyId") == ballot_style.get("partyId")
+        ],
+    )
+
+
+def election_definition_summary(definition: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        title=definition["title"],
+        date=definition["date"],
+        county=definition["county"],
+        precinctCount=len(definition["precincts"]),
+        ballotStyleCount=len(definition["ballotStyles"]),
+        contestCount=len(definition["contests"]),
+    )
+
+
+class BallotStyleDefinition(BaseModel):
+    # A copy of an election's definition trimmed down to just what voters with
+    # one ballot style need (see trim_election_definition), which is what we
+    # send to voters instead of the whole definition.
+    id = Column(String(200), primary_key=True)
+    election_id = Column(
+        String(200), ForeignKey("election.id", ondelete="cascade"), nullable=False
+    )
+    ballot_style_id = Column(String(200), nullable=False)
+    definition = Column(JSON, nullable=False)
+    definition_hash = Column(String(64), nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("election_id", "ballot_style_id"),)
 
 
 class Voter(BaseModel):
@@ -96,17 +189,52 @@ class Voter(BaseModel):
     ballot_url_token = Column(String(200))
     ballot_email_last_sent_at = Column(UTCDateTime)
 
+    # A summary of the voter's activities, kept up to date by
+    # record_voter_activity, so listing voters and counting them by status
+    # doesn't need to read VoterActivity.
+    last_activity_name = Column(String(200))
+    last_activity_at = Column(UTCDateTime)
+    login_count = Column(Integer, nullable=False, default=0)
+    first_ballot_printed_at = Column(UTCDateTime)
+
+    # Lazy loading activities for a list of voters would run one query per
+    # voter, so we raise instead. Load them up front with selectinload, or in
+    # bulk with a query on VoterActivity. Deleting a voter leaves deleting
+    # their activities to the database's ON DELETE CASCADE.
     activities = relationship(
         "VoterActivity",
         uselist=True,
         order_by="VoterActivity.created_at",
         cascade="all, delete-orphan",
+        lazy="raise_on_sql",
+        passive_deletes=True,
     )
 
     __table_args__ = (
         UniqueConstraint("election_id", "external_id"),
         UniqueConstraint("election_id", "email"),
         UniqueConstraint("ballot_url_token"),
+        # Indexes for filtering the list of voters in an election. The
+        # pattern_ops indexes support prefix searches (LIKE 'abc%').
+        Index("voter_election_id_precinct_idx", "election_id", "precinct"),
+        Index("voter_election_id_ballot_style_idx", "election_id", "ballot_style"),
+        Index(
+            "voter_election_id_was_manually_added_idx",
+            "election_id",
+            "was_manually_added",
+        ),
+        Index(
+            "voter_election_id_email_pattern_idx",
+            "election_id",
+            "email",
+            postgresql_ops={"email": "varchar_pattern_ops"},
+        ),
+        Index(
+            "voter_election_id_external_id_pattern_idx",
+            "election_id",
+            "external_id",
+            postgresql_ops={"external_id": "varchar_pattern_ops"},
+        ),
     )
 
 
@@ -118,13 +246,101 @@ class VoterActivity(BaseModel):
     activity_name = Column(String(200), nullable=False)
     info = Column(JSON)
 
+    __table_args__ = (
+        Index("voter_activity_voter_id_activity_name_idx", "voter_id", "activity_name"),
+    )
+
+
+class VoterFile(BaseModel):
+    id = Column(String(200), primary_key=True)
+    election_id = Column(
+        String(200), ForeignKey("election.id", ondelete="cascade"), nullable=False
+    )
+    name = Column(String(250), nullable=False)
+    mimetype = Column(String(200), nullable=False)
+
+
+class VoterFileChunk(BaseModel):
+    # Voter files can be large, so their contents are stored in chunks, which
+    # are written and read one at a time (see server/voter_file.py) rather
+    # than holding the whole file in memory.
+    voter_file_id = Column(
+        String(200), ForeignKey("voter_file.id", ondelete="cascade"), primary_key=True,
+    )
+    # Position of the chunk's first byte in the file
+    start_byte = Column(Integer, primary_key=True)
+    contents = Column(LargeBinary, nullable=False)
+
+
+class BallotEmailStatus(str, Enum):
+    QUEUED = "queued"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class BallotEmailMessage(BaseModel):
+    # An outbox of ballot emails. Sending ballots queues a message for each
+    # voter, which the worker sends (see server/ballot_email.py).
+    id = Column(String(200), primary_key=True)
+    election_id = Column(
+        String(200), ForeignKey("election.id", ondelete="cascade"), nullable=False
+    )
+    voter_id = Column(
+        String(200), ForeignKey("voter.id", ondelete="cascade"), nullable=False
+    )
+    # Identifies the send that queued this message, so retrying the send only
+    # queues messages for voters it hasn't already queued
+    idempotency_key = Column(String(200), nullable=False)
+    template = Column(Text, nullable=False)
+    # The ballot URL token this message sends. It only becomes the voter's
+    # ballot_url_token once the message is sent, so the voter's current link
+    # keeps working until the new one is delivered.
+    ballot_url_token = Column(String(200))
+
+    status = Column(String(20), nullable=False)  # BallotEmailStatus
+    attempts = Column(Integer, nullable=False, default=0)
+    # Failed sends are retried with exponential backoff
+    next_attempt_at = Column(UTCDateTime, nullable=False)
+    sent_at = Column(UTCDateTime)
+    error = Column(Text)
+
+    __table_args__ = (
+        # For the worker to find messages ready to send
+        Index(
+            "ballot_email_message_status_next_attempt_at_idx",
+            "status",
+            "next_attempt_at",
+        ),
+        # For counting an election's messages by status
+        Index("ballot_email_message_election_id_status_idx", "election_id", "status"),
+        UniqueConstraint("idempotency_key", "voter_id"),
+    )
+
+
+class BackgroundTask(BaseModel):
+    id = Column(String(200), primary_key=True)
+    task_name = Column(String(200), nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    started_at = Column(UTCDateTime)
+    completed_at = Column(UTCDateTime)
+    # Updated periodically while the task runs, so that if the worker running
+    # it dies, another worker can tell and run it again (see server/tasks.py)
+    heartbeat_at = Column(UTCDateTime)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Updated periodically while the task runs so clients can show progress
+    rows_processed = Column(Integer, nullable=False, default=0)
+    result = Column(JSON)
+    error = Column(Text)
+
 
 def record_voter_activity(
     voter_id: str,
     activity_name: str,
     info: Dict[str, Any] = None,
-    timestamp: dt = dt.now(timezone.utc),
+    timestamp: Optional[dt] = None,
 ):
+    timestamp = timestamp or dt.now(timezone.utc)
     db_session.add(
         VoterActivity(
             id=str(uuid.uuid4()),
@@ -134,3 +350,59 @@ def record_voter_activity(
             created_at=timestamp,
         )
     )
+
+    # Update the voter's activity summary in the same transaction
+    Voter.query.filter_by(id=voter_id).update(
+        voter_activity_summary(activity_name, timestamp), synchronize_session=False
+    )
+
+
+def record_voters_activity(voter_ids: List[str], activity_name: str, timestamp: dt):
+    """
+    Record the same activity for many voters at once (e.g. when a batch of
+    ballot emails is sent), with one bulk insert of the activities and one
+    update of the voters' activity summaries.
+    """
+    bulk_insert(
+        VoterActivity.__table__,  # pylint: disable=no-member
+        (
+            dict(
+                id=str(uuid.uuid4()),
+                voter_id=voter_id,
+                activity_name=activity_name,
+                created_at=timestamp,
+            )
+            for voter_id in voter_ids
+        ),
+    )
+    Voter.query.filter(Voter.id.in_(voter_ids)).update(
+        voter_activity_summary(activity_name, timestamp), synchronize_session=False
+    )
+
+
+def voter_activity_summary(activity_name: str, timestamp: dt) -> Dict[str, Any]:
+    # The updates to a voter's activity summary columns for a new activity.
+    # Activities can be recorded out of order (clients send their own
+    # timestamps), so we compare timestamps rather than assuming this is the
+    # latest one.
+    status: Dict[str, Any] = dict(
+        last_activity_name=case(
+            (
+                or_(
+                    Voter.last_activity_at.is_(None),
+                    Voter.last_activity_at <= timestamp,
+                ),
+                activity_name,
+            ),
+            else_=Voter.last_activity_name,
+        ),
+        # Postgres's GREATEST and LEAST ignore NULLs
+        last_activity_at=func.greatest(Voter.last_activity_at, timestamp),
+    )
+    if activity_name == "LoggedIn":
+        status["login_count"] = Voter.login_count + 1
+    if activity_name == "ConfirmedPrint":
+        status["first_ballot_printed_at"] = func.least(
+            Voter.first_ballot_printed_at, timestamp
+        )
+    return status
@@ -0,0 +1,115 @@
+import gzip
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from flask import Response, request
+
+# JSON responses for our hottest endpoints (the ones every page load hits).
+# They're serialized straight to bytes, skipping Flask's jsonify, and
+# compressed when the client accepts it. orjson and brotli are used if they
+# are installed, falling back to the standard library otherwise.
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Compressing tiny responses costs more than it saves
+COMPRESSION_MIN_SIZE = 1024
+
+# Compression levels for responses built per request. Cached responses are
+# only compressed once, so they use the maximum levels instead.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dump_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def compress(body: bytes, encoding: str, max_level: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if max_level else BROTLI_QUALITY)
+    # gzip headers include a timestamp unless we set it to 0, which would give
+    # the same body a different ETag each time it's compressed
+    return gzip.compress(body, compresslevel=9 if max_level else GZIP_LEVEL, mtime=0)
+
+
+def choose_encoding(body: bytes) -> Optional[str]:
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return None
+    if brotli is not None and "br" in request.accept_encodings:
+        return "br"
+    if "gzip" in request.accept_encodings:
+        return "gzip"
+    return None
+
+
+def encoded_response(body: bytes, encoding: Optional[str], status: int) -> Response:
+    response = Response(body, status=status, mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    body = dump_json(data)
+    encoding = choose_encoding(body)
+    if encoding:
+        body = compress(body, encoding)
+    return encoded_response(body, encoding, status)
+
+
+# Serialized (and compressed) bodies of responses that never change, keyed by
+# (cache key, encoding). Bounded by the total size of the bodies, since they
+# can range from a few bytes to many megabytes; the oldest entries are evicted
+# first.
+MAX_CACHED_RESPONSE_BYTES = 64 * 1024 * 1024
+cached_response_bodies: Dict[Tuple[str, Optional[str]], bytes] = {}
+cached_response_bytes = 0  # pylint: disable=invalid-name
+cached_response_bodies_lock = threading.Lock()
+
+
+def cached_json_response(cache_key: str, serialize: Callable[[], bytes]) -> Response:
+    """
+    Respond with a JSON body that is the same every time for the given cache
+    key (e.g. a content-addressed election definition). The body is only
+    serialized and compressed the first time; after that the bytes are reused.
+    `serialize` should return the serialized JSON body.
+    """
+    body = cached_response_bodies.get((cache_key, None))
+    if body is None:
+        body = serialize()
+        cache_response_body((cache_key, None), body)
+
+    encoding = choose_encoding(body)
+    if encoding:
+        uncompressed_body = body
+        body = cached_response_bodies.get((cache_key, encoding))
+        if body is None:
+            body = compress(uncompressed_body, encoding, max_level=True)
+            cache_response_body((cache_key, encoding), body)
+    return encoded_response(body, encoding, 200)
+
+
+def cache_response_body(key: Tuple[str, Optional[str]], body: bytes):
+    global cached_response_bytes  # pylint: disable=global-statement
+    if len(body) > MAX_CACHED_RESPONSE_BYTES:
+        return
+    # Requests may be handled on several threads at once
+    with cached_response_bodies_lock:
+        # Another request may have cached the same body in the meantime
+        cached_response_bytes -= len(cached_response_bodies.pop(key, b""))
+        while cached_response_bytes + len(body) > MAX_CACHED_RESPONSE_BYTES:
+            evicted_key = next(iter(cached_response_bodies))
+            cached_response_bytes -= len(cached_response_bodies.pop(evicted_key))
+        cached_response_bodies[key] = body
+        cached_response_bytes += len(body)
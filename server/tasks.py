@@ -0,0 +1,210 @@
+import uuid
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+from sqlalchemy import or_
+from werkzeug.exceptions import HTTPException
+
+from .config import RUN_BACKGROUND_TASKS_IMMEDIATELY
+from .database import engine
+from .models import BackgroundTask, db_session
+
+# Background tasks are stored in the database and run by a separate worker
+# process (see server/worker.py). Task handlers are registered by name using
+# the @background_task decorator and are called with the task id followed by
+# the task payload as keyword arguments. Whatever a handler returns is stored
+# as the task's result.
+#
+# While a task runs, its worker updates the task's heartbeat every
+# TASK_HEARTBEAT_INTERVAL. If a task's heartbeat is older than TASK_LEASE, the
+# worker running it must have died (rolling back whatever the task had done),
+# so another worker runs it again, up to MAX_TASK_ATTEMPTS times in all.
+
+TASK_HEARTBEAT_INTERVAL = timedelta(seconds=10)
+TASK_LEASE = timedelta(minutes=1)
+MAX_TASK_ATTEMPTS = 3
+
+task_dispatch: Dict[str, Callable] = {}
+# Handlers that clean up after a task that has failed for good (e.g. deleting
+# its input), called like the task's handler, in the same transaction that
+# records the failure.
+task_failure_dispatch: Dict[str, Callable] = {}
+
+
+def background_task(task_handler: Callable):
+    task_dispatch[task_handler.__name__] = task_handler
+    return task_handler
+
+
+def on_task_failure(task_handler: Callable):
+    def register(failure_handler: Callable):
+        task_failure_dispatch[task_handler.__name__] = failure_handler
+        return failure_handler
+
+    return register
+
+
+def create_background_task(
+    task_handler: Callable, payload: Dict[str, Any]
+) -> BackgroundTask:
+    assert task_dispatch.get(task_handler.__name__) is task_handler
+    task = BackgroundTask(
+        id=str(uuid.uuid4()), task_name=task_handler.__name__, payload=payload
+    )
+    db_session.add(task)
+
+    # In tests, we don't run a worker, so we just run the task right away
+    if RUN_BACKGROUND_TASKS_IMMEDIATELY:
+        run_task(task)
+
+    return task
+
+
+def run_task(task: BackgroundTask):
+    task_handler = task_dispatch[task.task_name]
+    if task.started_at is None:
+        task.started_at = datetime.now(timezone.utc)
+        task.heartbeat_at = task.started_at
+        task.attempts = 1
+    db_session.commit()
+
+    try:
+        with task_heartbeat(task.id):
+            result = task_handler(task.id, **task.payload)
+        task.result = result
+        task.completed_at = datetime.now(timezone.utc)
+        db_session.commit()
+    except Exception as error:  # pylint: disable=broad-except
+        db_session.rollback()
+        record_task_failure(
+            task,
+            error.description
+            if isinstance(error, HTTPException)
+            else "".join(traceback.format_exception_only(type(error), error)).strip(),
+        )
+        db_session.commit()
+
+
+def record_task_failure(task: BackgroundTask, error: str):
+    task.completed_at = datetime.now(timezone.utc)
+    task.error = error
+    failure_handler = task_failure_dispatch.get(task.task_name)
+    if failure_handler is not None:
+        failure_handler(task.id, **task.payload)
+
+
+@contextmanager
+def task_heartbeat(task_id: str):
+    # The heartbeat is written on its own connection (like progress, see
+    # record_task_progress), from a thread, so it keeps going while the task
+    # runs long queries.
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(TASK_HEARTBEAT_INTERVAL.total_seconds()):
+            with engine.begin() as connection:
+                connection.execute(
+                    BackgroundTask.__table__.update()  # pylint: disable=no-member
+                    .where(BackgroundTask.id == task_id)
+                    .values(heartbeat_at=datetime.now(timezone.utc))
+                )
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{task_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def claim_next_task() -> Optional[BackgroundTask]:
+    while True:
+        # Lock the oldest task that's unstarted or whose worker died, skipping
+        # any that another worker has already locked, and mark it as started
+        # so no other worker picks it up.
+        now = datetime.now(timezone.utc)
+        task = (
+            BackgroundTask.query.filter(
+                BackgroundTask.completed_at.is_(None),
+                or_(
+                    BackgroundTask.started_at.is_(None),
+                    BackgroundTask.heartbeat_at < now - TASK_LEASE,
+                ),
+            )
+            .order_by(BackgroundTask.created_at)
+            .with_for_update(skip_locked=True)
+            .limit(1)
+            .one_or_none()
+        )
+        if task is None:
+            db_session.commit()
+            return None
+
+        if task.attempts >= MAX_TASK_ATTEMPTS:
+            record_task_failure(task, "Task stopped unexpectedly too many times.")
+            db_session.commit()
+            continue
+
+        task.started_at = task.started_at or now
+        task.heartbeat_at = now
+        task.attempts += 1
+        db_session.commit()
+        return task
+
+
+def run_new_tasks():
+    while True:
+        task = claim_next_task()
+        if task is None:
+            return
+        run_task(task)
+
+
+def record_task_progress(task_id: str, rows_processed: int):
+    # Progress is written on its own connection and committed right away, so
+    # it's visible while the task's own transaction is still open.
+    with engine.begin() as connection:
+        connection.execute(
+            BackgroundTask.__table__.update()  # pylint: disable=no-member
+            .where(BackgroundTask.id == task_id)
+            .values(rows_processed=rows_processed)
+        )
+
+
+T = TypeVar("T")
+
+
+def track_progress(
+    task_id: str, rows: Iterable[T], report_every: int = 10000
+) -> Iterator[T]:
+    rows_processed = 0
+    for row in rows:
+        yield row
+        rows_processed += 1
+        if rows_processed % report_every == 0:
+            record_task_progress(task_id, rows_processed)
+    record_task_progress(task_id, rows_processed)
+
+
+def serialize_task(task: BackgroundTask) -> Dict[str, Any]:
+    if task.error is not None:
+        status = "ERRORED"
+    elif task.completed_at is not None:
+        status = "PROCESSED"
+    elif task.started_at is not None:
+        status = "PROCESSING"
+    else:
+        status = "QUEUED"
+
+    return dict(
+        id=task.id,
+        status=status,
+        startedAt=task.started_at and task.started_at.isoformat(),
+        completedAt=task.completed_at and task.completed_at.isoformat(),
+        rowsProcessed=task.rows_processed,
+        result=task.result,
+        error=task.error,
+    )
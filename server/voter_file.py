@@ -0,0 +1,655 @@
+import io
+import uuid
+from collections import defaultdict
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Set,
+    Tuple,
+)
+import xml.etree.ElementTree as ET
+from sqlalchemy import (
+    Column,
+    MetaData,
+    String,
+    Table,
+    and_,
+    exists,
+    literal,
+    or_,
+    select,
+)
+from werkzeug.exceptions import BadRequest
+from werkzeug.datastructures import FileStorage
+
+from .database import bulk_insert
+from .models import Election, Voter, VoterFile, VoterFileChunk, db_session
+from .csv_parse import (
+    EMAIL_REGEX,
+    CSVColumnType,
+    CSVValueType,
+    decode_csv_file,
+    parse_csv_with_row_numbers,
+    raise_error,
+)
+from .tasks import background_task, on_task_failure, track_progress
+
+
+class VoterFileError(BadRequest):
+    # Error types used to group errors when checking a voter file, in addition
+    # to the CSVErrorTypes from csv_parse.
+    INVALID_FILE = "invalidFile"
+    MISSING_FIELD = "missingField"
+    INVALID_EMAIL = "invalidEmail"
+    DUPLICATE_EMAIL = "duplicateEmail"
+    DUPLICATE_EXTERNAL_ID = "duplicateExternalId"
+    UNKNOWN_PRECINCT = "unknownPrecinct"
+    UNKNOWN_BALLOT_STYLE = "unknownBallotStyle"
+    PRECINCT_NOT_IN_BALLOT_STYLE = "precinctNotInBallotStyle"
+
+    def __init__(self, description: str, error_type: str = INVALID_FILE):
+        super().__init__(description)
+        self.error_type = error_type
+
+
+class XMLParseError(VoterFileError):
+    pass
+
+
+def local_name(tag: str) -> str:
+    # Strip the namespace from a tag, e.g. "{http://...}VoterDetails" -> "VoterDetails"
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_voter_xml(
+    xml_file: IO[bytes], on_error: Callable[[BadRequest], None] = raise_error
+) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Stream voters out of a NIST-style voter XML file one VoterDetails record at
+    a time, discarding each record once it's been read, so that memory use stays
+    flat regardless of file size.
+
+    For each record, we keep the first element (in document order) with each of
+    the tags we care about, which matches what a `.find(".//{*}Tag")` search
+    on the record would return.
+
+    Yields each record's number (counting from 1) along with the voter.
+    Records with missing fields are passed to on_error, which raises by default.
+    If on_error returns instead, the record is skipped. Malformed XML always
+    raises.
+    """
+    open_elements: List[ET.Element] = []
+    in_voter = False
+    voter: Dict[str, ET.Element] = {}
+    voter_number = 0
+
+    try:
+        for event, element in ET.iterparse(xml_file, events=("start", "end")):
+            tag = local_name(element.tag)
+
+            if event == "start":
+                open_elements.append(element)
+                if tag == "VoterDetails":
+                    in_voter = True
+                    voter = {}
+                elif in_voter and tag not in voter:
+                    if tag != "AddressLine" or element.get("type") == "email":
+                        voter[tag] = element
+                continue
+
+            open_elements.pop()
+            if tag != "VoterDetails" or not in_voter:
+                continue
+
+            voter_number += 1
+            try:
+                record = dict(
+                    external_id=voter_attribute(
+                        voter, "VoterIdentification", "Id", voter_number
+                    ),
+                    email=voter_text(voter, "AddressLine", voter_number),
+                    precinct=voter_text(voter, "BallotFormIdentifier", voter_number),
+                    ballot_style=voter_attribute(
+                        voter, "PollingPlace", "IdNumber", voter_number
+                    ),
+                )
+            except XMLParseError as error:
+                on_error(error)
+                record = None
+
+            # Drop the record we just read so the tree never grows
+            in_voter = False
+            element.clear()
+            if open_elements:
+                open_elements[-1].remove(element)
+
+            if record is not None:
+                yield voter_number, record
+    except ET.ParseError as error:
+        raise XMLParseError(
+            f"Please submit a valid XML voter file. {error}."
+        ) from error
+
+
+def voter_element(voter: Dict[str, ET.Element], tag: str, voter_number: int):
+    element = voter.get(tag)
+    if element is None:
+        raise XMLParseError(
+            f"Missing {tag} for voter {voter_number}.", XMLParseError.MISSING_FIELD
+        )
+    return element
+
+
+def voter_text(voter: Dict[str, ET.Element], tag: str, voter_number: int) -> str:
+    text = voter_element(voter, tag, voter_number).text
+    if not text:
+        raise XMLParseError(
+            f"Missing {tag} for voter {voter_number}.", XMLParseError.MISSING_FIELD
+        )
+    return text
+
+
+def voter_attribute(
+    voter: Dict[str, ET.Element], tag: str, attribute: str, voter_number: int
+) -> str:
+    value = voter_element(voter, tag, voter_number).get(attribute)
+    if value is None:
+        raise XMLParseError(
+            f"Missing {tag} {attribute} for voter {voter_number}.",
+            XMLParseError.MISSING_FIELD,
+        )
+    return value
+
+
+class ElectionDefinitionIndex(NamedTuple):
+    precinct_ids: Set[str]
+    # Ballot style id -> ids of the precincts that use that ballot style
+    ballot_style_precincts: Dict[str, Set[str]]
+
+
+def index_election_definition(definition: Dict[str, Any]) -> ElectionDefinitionIndex:
+    """
+    Compile the parts of an election definition we validate voters against into
+    lookup tables, so that checking each voter takes constant time instead of
+    scanning the definition's precincts and ballot styles.
+    """
+    return ElectionDefinitionIndex(
+        precinct_ids={precinct["id"] for precinct in definition["precincts"]},
+        ballot_style_precincts={
+            ballot_style["id"]: set(ballot_style["precincts"])
+            for ballot_style in definition["ballotStyles"]
+        },
+    )
+
+
+def validate_voter_against_definition(
+    index: ElectionDefinitionIndex, voter: str, precinct: str, ballot_style: str
+):
+    # voter describes the voter for error messages (e.g. their email)
+    if precinct not in index.precinct_ids:
+        raise VoterFileError(
+            f"Precinct {precinct} is not in the election definition (voter {voter})",
+            VoterFileError.UNKNOWN_PRECINCT,
+        )
+    ballot_style_precincts = index.ballot_style_precincts.get(ballot_style)
+    if ballot_style_precincts is None:
+        raise VoterFileError(
+            f"Ballot style {ballot_style} is not in the election definition (voter {voter})",
+            VoterFileError.UNKNOWN_BALLOT_STYLE,
+        )
+    if precinct not in ballot_style_precincts:
+        raise VoterFileError(
+            f"Precinct {precinct} is not associated with ballot style {ballot_style} in the election definition (voter {voter})",
+            VoterFileError.PRECINCT_NOT_IN_BALLOT_STYLE,
+        )
+
+
+# Temporary table that we load an uploaded voter file into so we can reconcile
+# it against the existing voters in the database with set-based SQL.
+voter_file_staging = Table(
+    "voter_file_staging",
+    MetaData(),
+    Column("id", String(200), nullable=False),
+    Column("external_id", String(200), nullable=False),
+    Column("email", String(200), nullable=False, unique=True),
+    Column("precinct", String(200), nullable=False),
+    Column("ballot_style", String(200), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+class VoterFileChanges(NamedTuple):
+    added: int
+    changed: int
+    removed: int
+
+
+def reconcile_voters(
+    election_id: str, voters: Iterable[Dict[str, str]]
+) -> VoterFileChanges:
+    """
+    Make the voters in an election match an uploaded voter file, matching
+    voters by email:
+    - Voters in the file but not the election are added
+    - Voters in both whose ID, precinct or ballot style changed are updated
+    - Voters in the election but not the file are removed (unless they were
+      added manually)
+
+    Runs in the current transaction, which must be committed afterwards.
+    """
+    staging = voter_file_staging
+    voters_table = Voter.__table__  # pylint: disable=no-member
+
+    staging.create(db_session.connection())  # pylint: disable=no-member
+    bulk_insert(staging, (dict(id=str(uuid.uuid4()), **voter) for voter in voters))
+
+    removed = db_session.execute(
+        voters_table.delete().where(
+            and_(
+                voters_table.c.election_id == election_id,
+                voters_table.c.was_manually_added.is_(False),
+                ~exists().where(staging.c.email == voters_table.c.email),
+            )
+        )
+    ).rowcount
+
+    # Voter IDs are unique per election, and a file may move an ID from one
+    # voter to another (or swap two voters' IDs). Postgres checks uniqueness
+    # row by row, so we first move every changed ID out of the way, giving each
+    # voter their (UUID) id as a placeholder external ID, then set the new IDs.
+    db_session.execute(
+        voters_table.update()
+        .where(
+            and_(
+                voters_table.c.election_id == election_id,
+                voters_table.c.email == staging.c.email,
+                voters_table.c.external_id != staging.c.external_id,
+            )
+        )
+        .values(external_id=voters_table.c.id)
+    )
+
+    changed = db_session.execute(
+        voters_table.update()
+        .where(
+            and_(
+                voters_table.c.election_id == election_id,
+                voters_table.c.email == staging.c.email,
+                or_(
+                    voters_table.c.external_id != staging.c.external_id,
+                    voters_table.c.precinct != staging.c.precinct,
+                    voters_table.c.ballot_style != staging.c.ballot_style,
+                ),
+            )
+        )
+        .values(
+            external_id=staging.c.external_id,
+            precinct=staging.c.precinct,
+            ballot_style=staging.c.ballot_style,
+        )
+    ).rowcount
+
+    added = db_session.execute(
+        voters_table.insert().from_select(
+            [
+                "id",
+                "external_id",
+                "email",
+                "precinct",
+                "ballot_style",
+                "election_id",
+                "was_manually_added",
+            ],
+            select(
+                staging.c.id,
+                staging.c.external_id,
+                staging.c.email,
+                staging.c.precinct,
+                staging.c.ballot_style,
+                literal(election_id),
+                literal(False),
+            ).where(
+                ~exists().where(
+                    and_(
+                        voters_table.c.election_id == election_id,
+                        voters_table.c.email == staging.c.email,
+                    )
+                )
+            ),
+        )
+    ).rowcount
+
+    return VoterFileChanges(added=added, changed=changed, removed=removed)
+
+
+def manually_added_voter_emails(election_id: str) -> Dict[str, str]:
+    # Manually added voters are kept when a voter file is uploaded, so their
+    # external ids can't be reused by other voters in the file. (Other voters
+    # that are kept are in the file, and reconcile_voters gives them their IDs
+    # from the file, so we don't need to check against them.) Maps external
+    # id -> email.
+    return dict(
+        db_session.query(Voter.external_id, Voter.email).filter_by(
+            election_id=election_id, was_manually_added=True
+        )
+    )
+
+
+def validate_voters(
+    voters: Iterable[Tuple[str, Dict[str, str]]],
+    definition_index: ElectionDefinitionIndex,
+    manual_voter_emails: Dict[str, str],
+    on_error: Callable[[BadRequest], None] = raise_error,
+) -> Iterator[Dict[str, str]]:
+    """
+    Check the voters parsed from a voter file (in either format) in a single
+    pass, so that we find any problems before writing to the database:
+    - Each email is a valid email address
+    - Emails and external ids are unique within the election, matching Voter's
+      unique constraints (see manually_added_voter_emails)
+    - Precincts and ballot styles match the election definition
+
+    Takes (location, voter) pairs from parse_voter_file, where location (e.g.
+    "row 2") is used in error messages, and yields the valid voters.
+
+    Invalid voters are passed to on_error, which raises by default. If
+    on_error returns instead, the voter is skipped.
+    """
+    seen_emails: Set[str] = set()
+    seen_external_ids: Set[str] = set()
+    for where, voter in voters:
+        email, external_id = voter["email"], voter["external_id"]
+        is_duplicate_email = email in seen_emails
+        is_duplicate_external_id = external_id in seen_external_ids
+        seen_emails.add(email)
+        seen_external_ids.add(external_id)
+
+        try:
+            if not EMAIL_REGEX.match(email):
+                raise VoterFileError(
+                    f"Expected an email address in {where}. Got: {email}.",
+                    VoterFileError.INVALID_EMAIL,
+                )
+            if is_duplicate_email:
+                raise VoterFileError(
+                    "Each voter must have a unique email."
+                    f" Found duplicate: {email} ({where}).",
+                    VoterFileError.DUPLICATE_EMAIL,
+                )
+            if is_duplicate_external_id:
+                raise VoterFileError(
+                    "Each voter must have a unique voter ID."
+                    f" Found duplicate: {external_id} ({where}).",
+                    VoterFileError.DUPLICATE_EXTERNAL_ID,
+                )
+            manual_voter_email = manual_voter_emails.get(external_id, email)
+            if manual_voter_email != email:
+                raise VoterFileError(
+                    f"Voter ID {external_id} ({where}) is already used by manually"
+                    f" added voter {manual_voter_email}.",
+                    VoterFileError.DUPLICATE_EXTERNAL_ID,
+                )
+            validate_voter_against_definition(
+                definition_index,
+                f"{email}, {where}",
+                voter["precinct"],
+                voter["ballot_style"],
+            )
+        except VoterFileError as error:
+            on_error(error)
+            continue
+
+        yield voter
+
+
+VOTER_FILE_CSV_COLUMNS = [
+    CSVColumnType(name="Voter ID", value_type=CSVValueType.TEXT),
+    # Emails and uniqueness are checked by validate_voters for both formats
+    CSVColumnType(name="Email", value_type=CSVValueType.TEXT),
+    CSVColumnType(name="Ballot Style", value_type=CSVValueType.TEXT),
+    CSVColumnType(name="Precinct", value_type=CSVValueType.TEXT),
+]
+
+
+def parse_voter_file(
+    voter_file: FileStorage, on_error: Callable[[BadRequest], None] = raise_error
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Parse the voters out of an uploaded voter file, to be checked by
+    validate_voters. Yields each voter along with where they are in the file
+    (e.g. "row 2" of a CSV or "record 1" of an XML file), for error messages.
+    Bad rows are passed to on_error, which raises by default.
+    If on_error returns instead, the row is skipped. Errors that stop us from
+    reading the rest of the file (e.g. bad headers or malformed XML) always
+    raise.
+    """
+    if "xml" in voter_file.mimetype:
+        return (
+            (f"record {record_number}", voter)
+            for record_number, voter in parse_voter_xml(voter_file.stream, on_error)
+        )
+
+    assert "csv" in voter_file.mimetype
+    return (
+        (
+            f"row {row_number}",
+            dict(
+                external_id=voter["Voter ID"],
+                email=voter["Email"],
+                ballot_style=voter["Ballot Style"],
+                precinct=voter["Precinct"],
+            ),
+        )
+        for row_number, voter in parse_csv_with_row_numbers(
+            decode_csv_file(voter_file), VOTER_FILE_CSV_COLUMNS, on_error,
+        )
+    )
+
+
+# Uploaded voter files are stored in chunks of this size until they've been
+# processed, so we never need to hold a whole file in memory.
+VOTER_FILE_CHUNK_SIZE = 1024 * 1024
+
+
+def save_voter_file(election_id: str, file: FileStorage) -> VoterFile:
+    """
+    Store an uploaded voter file to be processed by a background task, reading
+    it one chunk at a time. Runs in the current transaction.
+    """
+    voter_file = VoterFile(
+        id=str(uuid.uuid4()),
+        election_id=election_id,
+        name=file.filename,
+        mimetype=file.mimetype,
+    )
+    db_session.add(voter_file)
+    db_session.flush()
+
+    start_byte = 0
+    while True:
+        contents = file.stream.read(VOTER_FILE_CHUNK_SIZE)
+        if not contents:
+            return voter_file
+        # Insert with Core so chunks aren't kept in the session
+        db_session.execute(
+            VoterFileChunk.__table__.insert().values(  # pylint: disable=no-member
+                voter_file_id=voter_file.id, start_byte=start_byte, contents=contents
+            )
+        )
+        start_byte += len(contents)
+
+
+class VoterFileReader(io.RawIOBase):
+    """
+    A file-like object that reads a stored voter file, loading one chunk at a
+    time from the database as it's needed.
+    """
+
+    def __init__(self, voter_file_id: str):
+        super().__init__()
+        self.voter_file_id = voter_file_id
+        self.position = 0
+        self.chunk_start_byte = 0
+        self.chunk = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            raise io.UnsupportedOperation("Can't seek from the end of a voter file")
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        start = self.position - self.chunk_start_byte
+        if not 0 <= start < len(self.chunk):
+            # Load the chunk that contains the current position
+            chunk = (
+                db_session.query(VoterFileChunk.start_byte, VoterFileChunk.contents)
+                .filter(
+                    VoterFileChunk.voter_file_id == self.voter_file_id,
+                    VoterFileChunk.start_byte <= self.position,
+                )
+                .order_by(VoterFileChunk.start_byte.desc())
+                .first()
+            )
+            if chunk is None:
+                return 0
+            self.chunk_start_byte, self.chunk = chunk.start_byte, bytes(chunk.contents)
+            start = self.position - self.chunk_start_byte
+        data = self.chunk[start : start + len(buffer)]
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def open_voter_file(voter_file: VoterFile) -> FileStorage:
+    return FileStorage(
+        stream=io.BufferedReader(
+            VoterFileReader(voter_file.id), buffer_size=VOTER_FILE_CHUNK_SIZE
+        ),
+        filename=voter_file.name,
+        content_type=voter_file.mimetype,
+    )
+
+
+def load_voter_file(voter_file_id: str) -> VoterFile:
+    voter_file = VoterFile.query.get(voter_file_id)
+    # Voter files are deleted once their task finishes, so this should only
+    # happen if something else deleted it (e.g. the task was already done)
+    if voter_file is None:
+        raise VoterFileError(
+            "The uploaded voter file could not be found. Please upload it again."
+        )
+    return voter_file
+
+
+@background_task
+def process_voter_file(task_id: str, election_id: str, voter_file_id: str):
+    election = Election.query.get(election_id)
+    voter_file = load_voter_file(voter_file_id)
+
+    # Voters are streamed from the file into the database, so we only hold one
+    # batch of them in memory at a time (see bulk_insert)
+    changes = reconcile_voters(
+        election_id,
+        track_progress(
+            task_id,
+            validate_voters(
+                parse_voter_file(open_voter_file(voter_file)),
+                index_election_definition(election.definition),
+                manually_added_voter_emails(election_id),
+            ),
+        ),
+    )
+
+    # The file is only needed until the task finishes. Deleting it in the
+    # task's transaction means that if the task is retried (see
+    # server/tasks.py), the file is still there.
+    db_session.delete(voter_file)
+    return changes._asdict()
+
+
+# Default cap on the number of errors we report when checking a voter file
+DEFAULT_MAX_VOTER_FILE_ERRORS = 1000
+
+
+class VoterFileErrors:
+    """
+    Collects the errors found while checking a voter file, grouped by error
+    type. Every error is counted, but only the first max_errors are kept.
+    """
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.count = 0
+        self.errors: Dict[str, List[str]] = defaultdict(list)
+
+    def add(self, error: BadRequest):
+        if self.count < self.max_errors:
+            error_type = getattr(error, "error_type", VoterFileError.INVALID_FILE)
+            self.errors[error_type].append(error.description)
+        self.count += 1
+
+    def serialize(self) -> Dict[str, Any]:
+        return dict(
+            valid=self.count == 0,
+            errorCount=self.count,
+            truncated=self.count > self.max_errors,
+            errors=dict(self.errors),
+        )
+
+
+@background_task
+def check_voter_file(
+    task_id: str, election_id: str, voter_file_id: str, max_errors: int
+):
+    """
+    Validate a voter file without changing the election's voters, reading
+    through the whole file once and collecting every error (up to max_errors)
+    instead of stopping at the first one.
+    """
+    election = Election.query.get(election_id)
+    voter_file = load_voter_file(voter_file_id)
+    errors = VoterFileErrors(max_errors)
+
+    try:
+        for _ in track_progress(
+            task_id,
+            validate_voters(
+                parse_voter_file(open_voter_file(voter_file), on_error=errors.add),
+                index_election_definition(election.definition),
+                manually_added_voter_emails(election_id),
+                on_error=errors.add,
+            ),
+        ):
+            pass
+    except BadRequest as error:
+        # An error we can't recover from, so we report what we found so far
+        errors.add(error)
+
+    db_session.delete(voter_file)
+    return errors.serialize()
+
+
+@on_task_failure(process_voter_file)
+@on_task_failure(check_voter_file)
+def delete_failed_task_voter_file(_task_id: str, voter_file_id: str, **_payload):
+    VoterFile.query.filter_by(id=voter_file_id).delete()
@@ -0,0 +1,28 @@
+import time
+import logging
+
+from .ballot_email import send_next_ballot_emails
+from .models import db_session
+from .tasks import run_new_tasks
+
+# pylint: disable=unused-import
+# Import modules that define background tasks so their handlers get registered
+from . import voter_file
+
+logger = logging.getLogger("rbm.worker")
+
+POLL_INTERVAL_SECONDS = 2
+
+if __name__ == "__main__":
+    logger.info("worker started")
+    while True:
+        try:
+            run_new_tasks()
+            # Send one batch of emails at a time so new tasks don't have to wait
+            # for a large send to finish. Keep going without sleeping while
+            # there are more to send, unless we've hit the send rate limit.
+            emails_sent = send_next_ballot_emails()
+        finally:
+            db_session.remove()
+        if emails_sent == 0:
+            time.sleep(POLL_INTERVAL_SECONDS)